@@ -0,0 +1,189 @@
+"""Admission queue for events that sell out fast.
+
+On an event with `admission_queue` set, POST /tickets doesn't buy the ticket itself. It queues a
+claim in this worker's memory and answers 202 with a claim token right away. A single admission
+thread per worker takes claims off the queue in batches of up to ADMISSION_BATCH_SIZE and commits
+each batch as one transaction: one seat UPDATE per event for the whole batch, one multi-row
+ticket INSERT, one sales update. The event row and the database's write lock are then taken once
+per batch instead of once per buyer. GET /tickets/claims/<token> reports the outcome.
+
+Claims live in memory until they are committed, so a worker that dies loses its queued claims;
+their status turns into 404 and the client buys again. A full queue answers 503 with Retry-After
+instead of letting latency grow without bound. Outcomes are kept for ADMISSION_CLAIM_TTL in a
+store of their own, never in the evictable response cache: in Redis with CACHE_BACKEND=redis, where
+any worker can answer the status of a claim queued on another. Without Redis, events can only turn
+the queue on when ADMISSION_LOCAL_CLAIMS keeps claims in this worker's memory (a single worker, or
+local testing); polls landing on another worker would otherwise find nothing.
+"""
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from cache import RedisCache, make_store
+from models import db, Event, Ticket
+from routes.tickets import insert_tickets, reserve_seats
+from sales import SalesDelta
+import tasks
+
+logger = logging.getLogger('eventhub.admission')
+
+Claim = namedtuple('Claim', 'token user_id event_id queued_at')
+
+
+class AdmissionQueue:
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config['ADMISSION_BATCH_SIZE']
+        self.batch_wait = app.config['ADMISSION_BATCH_WAIT_MS'] / 1000
+        self.ttl = app.config['ADMISSION_CLAIM_TTL']
+        # Not the response cache, whose LRU would drop claims under page traffic. While a claim
+        # waits, at most ADMISSION_QUEUE_MAX others are answered and as many queued, so a queued
+        # claim is never the one evicted; finished ones go oldest first.
+        self.store = make_store(app, 'admission', app.config['ADMISSION_QUEUE_MAX'] * 4, self.ttl)
+        self.shared = isinstance(self.store, RedisCache) or app.config['ADMISSION_LOCAL_CLAIMS']
+        self._queue = queue.Queue(app.config['ADMISSION_QUEUE_MAX'])
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def submit(self, user_id, event_id):
+        """Queue a purchase and return its claim token, or None if ADMISSION_QUEUE_MAX claims are waiting"""
+        self._ensure_started()
+        claim = Claim(secrets.token_urlsafe(16), user_id, event_id, time.time())
+        self._record(claim, 'queued')
+        try:
+            self._queue.put_nowait(claim)
+        except queue.Full:
+            self.store.delete(f'claims:{claim.token}')
+            return None
+        return claim.token
+
+    def status(self, token):
+        """The claim's outcome as a dict, or None if it is unknown or expired"""
+        hit = self.store.get(f'claims:{token}')
+        return json.loads(hit[1]) if hit else None
+
+    def _record(self, claim, status, **outcome):
+        body = {'claim': claim.token, 'status': status, 'event_id': claim.event_id, 'user_id': claim.user_id, **outcome}
+        # Kept as an (etag, body) pair, the shape every cache backend stores
+        self.store.set(f'claims:{claim.token}', (status, self.app.json.dumps(body).encode()), ttl=self.ttl)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name='admission', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _next_batch(self):
+        """Block for one claim, then collect more for up to ADMISSION_BATCH_WAIT_MS"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with self.app.app_context():
+                    self._commit(batch)
+            except Exception:
+                logger.exception('Admission batch of %s claims failed', len(batch))
+                for claim in batch:
+                    self._record(claim, 'rejected', code=500, error='Purchase failed, please retry')
+
+    def _commit(self, batch):
+        """Commit a batch; if one claim conflicts with a concurrent direct purchase, redo them one by one"""
+        try:
+            outcomes = commit_claims(batch)
+        except IntegrityError:
+            db.session.rollback()
+            outcomes = {}
+            for claim in batch:
+                try:
+                    outcomes.update(commit_claims([claim]))
+                except IntegrityError:
+                    db.session.rollback()
+                    outcomes[claim.token] = ('rejected', {'code': 400, 'error': 'Ticket already exists'})
+        for claim in batch:
+            status, outcome = outcomes[claim.token]
+            self._record(claim, status, **outcome)
+
+
+def reserve_up_to(event, count):
+    """Take as many of `count` seats as the event has left; returns how many were taken"""
+    for _ in range(3):
+        sold, capacity = db.session.execute(
+            select(Event.tickets_sold, Event.capacity).where(Event.id == event.id)).one()
+        wanted = count if capacity is None else min(count, capacity - sold)
+        if wanted <= 0:
+            return 0
+        if reserve_seats(event.id, wanted):
+            return wanted
+        # a direct purchase took seats in between; read the count again
+    return 0
+
+
+def commit_claims(claims):
+    """Turn `claims` into tickets in one transaction, first come first served; returns {token: (status, outcome)}"""
+    outcomes = {}
+    by_event = defaultdict(list)
+    for claim in claims:
+        by_event[claim.event_id].append(claim)
+    events = {e.id: e for e in Event.query.filter(Event.id.in_(list(by_event)))}
+    owned = set(db.session.execute(select(Ticket.user_id, Ticket.event_id).where(
+        Ticket.event_id.in_(list(events)), Ticket.user_id.in_({c.user_id for c in claims}))).tuples())
+    rows = {}
+    sales = SalesDelta()
+    for event_id, queued in by_event.items():
+        event = events.get(event_id)
+        if event is None:
+            outcomes.update((c.token, ('rejected', {'code': 404, 'error': 'Event not found'})) for c in queued)
+            continue
+        buyers = []
+        for claim in queued:
+            if (claim.user_id, event_id) in owned:
+                outcomes[claim.token] = ('rejected', {'code': 400, 'error': 'Ticket already exists'})
+            else:
+                owned.add((claim.user_id, event_id))
+                buyers.append(claim)
+        seats = reserve_up_to(event, len(buyers)) if buyers else 0
+        for claim in buyers[seats:]:
+            outcomes[claim.token] = ('rejected', {'code': 409, 'error': 'Event is sold out'})
+        free = event.price == 0
+        for claim in buyers[:seats]:
+            row = rows[claim.token] = {'user_id': claim.user_id, 'event_id': event_id,
+                                       'status': 'confirmed' if free else 'pending',
+                                       'payment_status': 'free' if free else 'unpaid'}
+            sales.add(event_id, row['status'], row['payment_status'])
+    tokens = {(row['user_id'], row['event_id']): token for token, row in rows.items()}
+    tickets = {tokens[t.user_id, t.event_id]: t for t in insert_tickets(list(rows.values()))}
+    sales.apply()
+    tasks.enqueue_confirmed([t for t in tickets.values() if t.status == 'confirmed'])
+    # Serialized before the commit expires them, which would reload every ticket one by one
+    outcomes.update((token, ('confirmed', {'code': 201, 'ticket': t.to_dict()})) for token, t in tickets.items())
+    db.session.commit()
+    return outcomes
+
+
+def init_app(app):
+    app.config.setdefault('ADMISSION_BATCH_SIZE', 200)
+    app.config.setdefault('ADMISSION_BATCH_WAIT_MS', 5)
+    app.config.setdefault('ADMISSION_QUEUE_MAX', 10000)
+    app.config.setdefault('ADMISSION_CLAIM_TTL', 600)
+    app.config.setdefault('ADMISSION_LOCAL_CLAIMS', False)
+    app.extensions['admission'] = AdmissionQueue(app)
@@ -1,11 +1,25 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
 from models import db
 from config import config
+from cache import cache
+import identity
+import passwords
+import database
+import metrics
+import compression
+import replicas
+import revocation
+import outbox
+import archive
+import admission
+import cli
+from ratelimit import limiter
+from serialization import JSONProvider
 
 from routes.auth import auth_bp
 from routes.events import events_bp
@@ -15,13 +29,26 @@ from routes.tickets import tickets_bp
 def create_app(config_name=None):
     """Factory function to create the Flask app"""
     app = Flask(__name__)
+    app.json = JSONProvider(app)
 
     config_name = config_name or os.environ.get('FLASK_ENV', 'development')
     app.config.from_object(config[config_name])
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
     # Initializations
+    database.init_app(app)
     db.init_app(app)
-    migrate = Migrate(app, db)
+    database.configure_engines(app)
+    metrics.init_app(app)
+    compression.init_app(app)
+    limiter.init_app(app)
+    cache.init_app(app)
+    replicas.init_app(app)
+    passwords.init_app(app)
+    outbox.init_app(app)
+    archive.init_app(app)
+    admission.init_app(app)
     CORS(
     app,
     resources={r"/*": {"origins": ["http://127.0.0.1:5173","https://eventhub-hxlf.onrender.com"]}},
@@ -29,12 +56,17 @@ def create_app(config_name=None):
     allow_headers=["Content-Type", "Authorization"]
     )
     jwt = JWTManager(app)
+    identity.init_app(app, jwt)
+    revocation.init_app(app, jwt)
 
     # Register Blueprints
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(events_bp, url_prefix="/events")
     app.register_blueprint(tickets_bp, url_prefix="/tickets")
 
+    # CLI commands (`flask db ...`, `flask data ...`), imported on first use
+    cli.init_app(app)
+
     # Default landing page
     @app.route('/')
     def index():
@@ -58,6 +90,7 @@ def create_app(config_name=None):
                 <li>Auth: /auth/signup, /auth/login</li>
                 <li>Events: /events (GET/POST), /events/&lt;id&gt; (GET/PATCH/DELETE)</li>
                 <li>Tickets: /tickets (POST), /tickets/&lt;id&gt;/confirm, /tickets/&lt;id&gt;/cancel, /tickets/my</li>
+                <li>Monitoring: /health, /metrics</li>
             </ul>
         </body>
         </html>
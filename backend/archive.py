@@ -0,0 +1,103 @@
+"""Moves events that ended ARCHIVE_AFTER_DAYS ago, with their tickets, into archive tables.
+
+Live tables, their indexes and every list query then only carry current events. Each batch of
+at most ARCHIVE_BATCH_SIZE events is one transaction: copy the events and tickets into
+archived_events/archived_tickets, drop the live rows with their sales aggregates and search
+entries, and tombstone the events so `GET /events?since=` clients remove them too. Batches go
+oldest first. An interrupted run simply resumes with the next one.
+
+Archived rows stay readable through `include_archived=1` on the list, detail and my-tickets
+endpoints. `flask data archive` runs it by hand. With ARCHIVE_SCHEDULE_HOURS set, the outbox
+workers run it on that schedule instead, ARCHIVE_MAX_BATCHES at a time.
+"""
+import gzip
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, literal, select
+
+from models import db, ArchivedEvent, ArchivedTicket, Event, EventSales, Ticket
+import catalogue
+import outbox
+import search
+
+EVENT_COLUMNS = [c.name for c in Event.__table__.columns]
+TICKET_COLUMNS = [c.name for c in Ticket.__table__.columns]
+
+
+def cutoff(days=None):
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def archive_batch(before, batch_size, export=None):
+    """Archive up to `batch_size` events dated before `before` and commit; returns (events, tickets) moved"""
+    session = db.session
+    ids = session.scalars(select(Event.id).where(Event.date < before)
+                          .order_by(Event.date, Event.id).limit(batch_size)).all()
+    if not ids:
+        session.rollback()
+        return 0, 0
+    now = datetime.utcnow()
+    session.execute(insert(ArchivedEvent).from_select(
+        EVENT_COLUMNS + ['archived_at'],
+        select(*[Event.__table__.c[c] for c in EVENT_COLUMNS], literal(now)).where(Event.id.in_(ids))))
+    tickets = session.execute(insert(ArchivedTicket).from_select(
+        TICKET_COLUMNS, select(*[Ticket.__table__.c[c] for c in TICKET_COLUMNS]).where(Ticket.event_id.in_(ids))))
+    if export:
+        write_export(export, ids)
+    search.unindex_events(ids)
+    catalogue.tombstone_many(ids)
+    session.execute(delete(Ticket).where(Ticket.event_id.in_(ids)))
+    session.execute(delete(EventSales).where(EventSales.event_id.in_(ids)))
+    session.execute(delete(Event).where(Event.id.in_(ids)))
+    session.commit()
+    return len(ids), tickets.rowcount
+
+
+def archive(before, batch_size, max_batches=None, export=None, on_batch=None):
+    """Run batches until nothing is left before `before` (or `max_batches` ran); returns (events, tickets)"""
+    events = tickets = batches = 0
+    while max_batches is None or batches < max_batches:
+        started = time.perf_counter()
+        moved = archive_batch(before, batch_size, export)
+        if not moved[0]:
+            break
+        events, tickets, batches = events + moved[0], tickets + moved[1], batches + 1
+        if on_batch:
+            on_batch(moved, time.perf_counter() - started)
+    return events, tickets
+
+
+def write_export(path, event_ids):
+    """Append the archived events, each with its tickets, to a gzipped JSONL file.
+
+    Written before the batch commits, so a failed batch can leave lines that a rerun writes again;
+    consumers should key on the event id.
+    """
+    tickets = {}
+    for row in db.session.execute(select(ArchivedTicket.__table__).where(ArchivedTicket.event_id.in_(event_ids))
+                                  .order_by(ArchivedTicket.id)).mappings():
+        tickets.setdefault(row['event_id'], []).append(dict(row))
+    dumps = current_app.json.dumps
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        for row in db.session.execute(select(ArchivedEvent.__table__).where(ArchivedEvent.id.in_(event_ids))
+                                      .order_by(ArchivedEvent.date, ArchivedEvent.id)).mappings():
+            f.write(dumps({**row, 'tickets': tickets.get(row['id'], [])}) + '\n')
+
+
+@outbox.handler('archive.run')
+def scheduled_archive(payload, key):
+    cfg = current_app.config
+    archive(cutoff(), cfg['ARCHIVE_BATCH_SIZE'], cfg['ARCHIVE_MAX_BATCHES'])
+
+
+def init_app(app):
+    app.config.setdefault('ARCHIVE_AFTER_DAYS', 30)
+    app.config.setdefault('ARCHIVE_BATCH_SIZE', 500)
+    app.config.setdefault('ARCHIVE_SCHEDULE_HOURS', 0)
+    app.config.setdefault('ARCHIVE_MAX_BATCHES', 20)
+    pool = app.extensions.get('outbox')
+    if app.config['ARCHIVE_SCHEDULE_HOURS'] and pool is not None:
+        pool.every(app.config['ARCHIVE_SCHEDULE_HOURS'] * 3600, 'archive.run')
@@ -0,0 +1,87 @@
+"""Compare direct purchases with the admission queue on one hot event.
+
+Usage: python benchmarks/admission.py [--buyers 3000] [--capacity 2000] [--threads 32] [--batch-size 200]
+
+Each mode gets a fresh database and the same buyers firing POST /tickets from --threads threads.
+Direct purchases each commit their own transaction; queued ones answer 202 and the admission
+thread commits them in batches. Throughput counts a queued purchase only once its outcome is
+final, so it is what buyers actually get, not just how fast claims are accepted. The response
+cache runs with its default in-memory backend, so claims would be lost if they shared its LRU.
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from common import make_app, create_users, auth_header, percentile
+
+
+def run(queued, args):
+    app = make_app(OUTBOX_WORKERS=0, ADMISSION_BATCH_SIZE=args.batch_size, CACHE_BACKEND='memory',
+                   ADMISSION_LOCAL_CLAIMS=True)
+
+    from models import db, Event, Ticket
+
+    with app.app_context():
+        organizer, *buyers = create_users(args.buyers + 1)
+        event = Event(title='Hot sale', date=datetime(2030, 1, 1), location='Nairobi', price=0,
+                      capacity=args.capacity, admission_queue=queued, creator_id=organizer)
+        db.session.add(event)
+        db.session.commit()
+        event_id = event.id
+        headers = [auth_header(b) for b in buyers]
+    admission = app.extensions['admission']
+
+    def buy(header):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/tickets/', json={'event_id': event_id}, headers=header)
+        return response.status_code, time.perf_counter() - start, response.get_json().get('claim')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(buy, headers))
+    accepted = time.perf_counter() - start
+    statuses = Counter(status for status, _, claim in results if not claim)  # 202s count once resolved
+    if queued:
+        pending = {claim for _, _, claim in results if claim}
+        while pending:
+            outcomes = {claim: admission.status(claim) for claim in pending}
+            assert None not in outcomes.values(), 'a claim was lost before its buyer saw the outcome'
+            statuses.update(o['code'] for o in outcomes.values() if o['status'] != 'queued')
+            pending = {claim for claim, o in outcomes.items() if o['status'] == 'queued'}
+            time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for _, latency, _ in results]
+    with app.app_context():
+        sold = db.session.get(Event, event_id).tickets_sold
+        issued = Ticket.query.filter_by(event_id=event_id).count()
+    print(f"{'queued' if queued else 'direct'}: {len(results)} purchases resolved in {elapsed:.2f}s"
+          f" ({len(results) / elapsed:.0f}/s; requests answered in {accepted:.2f}s),"
+          f" request latency p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"  outcomes: {dict(sorted(statuses.items()))}, capacity={args.capacity} sold={sold} issued={issued}")
+
+    assert issued == sold, 'sold counter drifted from issued tickets'
+    assert issued <= args.capacity, 'event oversold'
+    assert statuses[201] == issued, 'a purchase was confirmed without a ticket'
+    return len(results) / elapsed, percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=3000)
+    parser.add_argument('--capacity', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    direct = run(False, args)
+    queued = run(True, args)
+    print(f"queued vs direct: {queued[0] / direct[0]:.1f}x throughput, p99 {queued[1] * 1000:.1f}ms vs {direct[1] * 1000:.1f}ms")
+    print('✅ no oversell')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Helpers shared by the benchmark scripts: an app on a throwaway database and fast fixtures."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config, ProductionConfig  # noqa: E402
+
+
+def make_app(database_uri=None, **overrides):
+    """Build the app with ProductionConfig against a fresh database (a temp SQLite file by default)"""
+    from app import create_app
+    from models import db
+
+    if database_uri is None:
+        database_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='eventhub-bench-'), 'bench.db')
+    settings = {'SQLALCHEMY_DATABASE_URI': database_uri, 'CACHE_BACKEND': 'null', 'RATELIMIT_ENABLED': False, **overrides}
+    config['benchmark'] = type('BenchmarkConfig', (ProductionConfig,), settings)
+    app = create_app('benchmark')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def create_users(count, prefix='user'):
+    """Insert `count` users in one statement, sharing a single precomputed password hash"""
+    from models import db, User
+    from passwords import get_hasher
+
+    password_hash = get_hasher().hash('password')
+    first_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com', 'password_hash': password_hash}
+        for i in range(first_id, first_id + count)
+    ])
+    db.session.commit()
+    return list(range(first_id, first_id + count))
+
+
+def auth_header(user_id):
+    from flask_jwt_extended import create_access_token
+    return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
@@ -0,0 +1,260 @@
+"""Drive mixed traffic through every blueprint and report latency, throughput and query counts.
+
+Usage:
+    python benchmarks/load_test.py [--users 20000 --events 100000 --tickets 1000000]
+                                   [--requests 20000 --threads 8] [--output results.json]
+
+By default requests go through the Flask test client in this process, which also lets us count
+SQL statements per request. With --target http://127.0.0.1:5000 they go over HTTP instead, to a
+server started against the same --database-uri (query counts are then not available).
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event
+
+from common import make_app, create_users, auth_header, percentile
+
+CHUNK = 20000
+LOCATIONS = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Malindi', 'Naivasha']
+BASE_DATE = datetime(2025, 1, 1)
+
+# (scenario name, weight) — roughly what the frontend generates
+MIX = [
+    ('events.list', 30), ('events.list_filtered', 10), ('events.list_next_page', 5), ('events.get', 20),
+    ('tickets.my', 10), ('tickets.create', 8), ('tickets.confirm', 4), ('tickets.cancel', 3),
+    ('events.create', 3), ('events.update', 2), ('auth.login', 3), ('auth.signup', 1),
+]
+
+
+def generate_dataset(db, n_users, n_events, n_tickets):
+    """Bulk-insert a deterministic dataset; ticket i belongs to user (i % n_users) + 1"""
+    from models import Event, Ticket
+
+    started = time.perf_counter()
+    create_users(n_users)
+    rng = random.Random(42)
+    for start in range(0, n_events, CHUNK):
+        db.session.execute(Event.__table__.insert(), [{
+            'title': f'Event {i}', 'description': f'Description of event {i} ' * 4,
+            'date': BASE_DATE + timedelta(hours=i), 'location': rng.choice(LOCATIONS),
+            'price': rng.choice([0, 0, 100, 250, 500, 1000]), 'creator_id': i % n_users + 1,
+            'created_at': BASE_DATE, 'tickets_sold': 0,
+        } for i in range(start, min(start + CHUNK, n_events))])
+        db.session.commit()
+
+    per_user = -(-n_tickets // n_users)
+    if per_user > n_events:
+        raise SystemExit('Not enough events for every user to hold distinct tickets')
+    stride = n_events // per_user
+    for start in range(0, n_tickets, CHUNK):
+        db.session.execute(Ticket.__table__.insert(), [{
+            'user_id': i % n_users + 1, 'event_id': ((i // n_users) * stride + i % n_users) % n_events + 1,
+            'status': 'confirmed', 'payment_status': 'paid', 'created_at': BASE_DATE, 'updated_at': BASE_DATE,
+        } for i in range(start, min(start + CHUNK, n_tickets))])
+        db.session.commit()
+    db.session.execute(db.text(
+        "UPDATE events SET tickets_sold = (SELECT COUNT(*) FROM tickets WHERE tickets.event_id = events.id)"))
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+class Traffic:
+    """Builds one random request per scenario against the generated dataset"""
+
+    def __init__(self, app, n_users, n_events, n_tickets, seed):
+        self.app = app
+        self.n_users, self.n_events, self.n_tickets = n_users, n_events, n_tickets
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.signups = 0
+        self.cursors = []
+
+    def headers(self, user_id):
+        if user_id not in self.tokens:
+            with self.app.app_context():
+                self.tokens[user_id] = auth_header(user_id)
+        return self.tokens[user_id]
+
+    def next_request(self):
+        """Return (scenario, method, path, json body, headers)"""
+        with self.lock:
+            rng = self.rng
+            scenario = rng.choices([m[0] for m in MIX], [m[1] for m in MIX])[0]
+            user = rng.randint(1, self.n_users)
+            ticket = rng.randint(1, self.n_tickets)
+            event = rng.randint(1, self.n_events)
+            if scenario == 'events.list':
+                return scenario, 'GET', '/events/', None, {}
+            if scenario == 'events.list_filtered':
+                start = (BASE_DATE + timedelta(hours=rng.randint(0, self.n_events))).isoformat()
+                return scenario, 'GET', f'/events/?location={rng.choice(LOCATIONS)}&date_from={start}&max_price=500', None, {}
+            if scenario == 'events.list_next_page':
+                cursor = rng.choice(self.cursors) if self.cursors else ''
+                return scenario, 'GET', f'/events/?cursor={cursor}' if cursor else '/events/', None, {}
+            if scenario == 'events.get':
+                return scenario, 'GET', f'/events/{event}', None, {}
+            if scenario == 'tickets.my':
+                return scenario, 'GET', '/tickets/my', None, self.headers(user)
+            if scenario == 'tickets.create':
+                return scenario, 'POST', '/tickets/', {'event_id': event}, self.headers(user)
+            if scenario in ('tickets.confirm', 'tickets.cancel'):
+                owner = (ticket - 1) % self.n_users + 1
+                action = scenario.split('.')[1]
+                return scenario, 'PATCH', f'/tickets/{ticket}/{action}', None, self.headers(owner)
+            if scenario == 'events.create':
+                return scenario, 'POST', '/events', {
+                    'title': 'Load test event', 'date': '2031-06-01T18:00:00', 'location': rng.choice(LOCATIONS), 'price': 100,
+                }, self.headers(user)
+            if scenario == 'events.update':
+                creator = (event - 1) % self.n_users + 1
+                return scenario, 'PATCH', f'/events/{event}', {'price': rng.choice([100, 200])}, self.headers(creator)
+            if scenario == 'auth.login':
+                return scenario, 'POST', '/auth/login', {'email': f'user{user}@example.com', 'password': 'password'}, {}
+            self.signups += 1
+            name = f'loadtest{self.signups}_{int(time.time())}'
+            return scenario, 'POST', '/auth/signup', {'username': name, 'email': f'{name}@example.com', 'password': 'password'}, {}
+
+    def remember_cursor(self, body):
+        try:
+            cursor = json.loads(body).get('next_cursor')
+        except (ValueError, AttributeError):
+            return
+        if cursor:
+            with self.lock:
+                self.cursors = (self.cursors + [cursor])[-100:]
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.local = threading.local()
+        self.app = app
+
+    def send(self, method, path, body, headers):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        response = self.local.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+
+class HttpDriver:
+    def __init__(self, target):
+        self.target = target.rstrip('/')
+
+    def send(self, method, path, body, headers):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.target + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json', **headers})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-uri', default=None)
+    parser.add_argument('--target', default=None, help='base URL of a running server; default is in-process')
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args()
+
+    from models import db
+
+    # Production-like settings, but cheap hashes so logins don't drown every other endpoint
+    app = make_app(args.database_uri, CACHE_BACKEND='memory', PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+    with app.app_context():
+        load_seconds = generate_dataset(db, args.users, args.events, args.tickets)
+    print(f"dataset: {args.users} users, {args.events} events, {args.tickets} tickets in {load_seconds:.1f}s")
+
+    traffic = Traffic(app, args.users, args.events, args.tickets, args.seed)
+    driver = HttpDriver(args.target) if args.target else TestClientDriver(app)
+
+    queries = threading.local()
+    if not args.target:
+        with app.app_context():
+            sa_event.listen(db.engine, 'before_cursor_execute',
+                            lambda *a: setattr(queries, 'count', getattr(queries, 'count', 0) + 1))
+
+    samples = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    query_counts = defaultdict(list)
+
+    def one(_):
+        scenario, method, path, body, headers = traffic.next_request()
+        queries.count = 0
+        start = time.perf_counter()
+        status, data = driver.send(method, path, body, headers)
+        elapsed = time.perf_counter() - start
+        if scenario.startswith('events.list') and status == 200:
+            traffic.remember_cursor(data)
+        return scenario, status, elapsed, queries.count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        for scenario, status, elapsed, count in pool.map(one, range(args.requests)):
+            samples[scenario].append(elapsed)
+            statuses[scenario][status] += 1
+            query_counts[scenario].append(count)
+    duration = time.perf_counter() - started
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'driver': args.target or 'flask-test-client',
+        'dataset': {'users': args.users, 'events': args.events, 'tickets': args.tickets, 'load_seconds': round(load_seconds, 2)},
+        'requests': args.requests,
+        'threads': args.threads,
+        'duration_seconds': round(duration, 3),
+        'requests_per_second': round(args.requests / duration, 1),
+        'endpoints': {},
+    }
+    print(f"\n{'scenario':<24} {'count':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}  statuses")
+    for scenario in sorted(samples):
+        latencies = samples[scenario]
+        counts = query_counts[scenario]
+        stats = {
+            'count': len(latencies),
+            'requests_per_second': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': None if args.target else round(sum(counts) / len(counts), 2),
+            'max_queries': None if args.target else max(counts),
+            'statuses': {str(k): v for k, v in sorted(statuses[scenario].items())},
+        }
+        report['endpoints'][scenario] = stats
+        print(f"{scenario:<24} {stats['count']:>6} {stats['requests_per_second']:>7} {stats['p50_ms']:>6.1f}ms "
+              f"{stats['p95_ms']:>6.1f}ms {stats['p99_ms']:>6.1f}ms {stats['queries_per_request'] or '-':>8}  {stats['statuses']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\n{report['requests_per_second']} req/s overall; results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
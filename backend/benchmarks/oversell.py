@@ -0,0 +1,111 @@
+"""Fire many concurrent purchases at one event and check that it never oversells.
+
+Usage: python benchmarks/oversell.py [--buyers 2000] [--capacity 500] [--threads 32]
+
+After the sale, half of the ticket holders run cancel -> confirm -> cancel on their tickets while
+the buyers who were turned away try again, to check that a canceled ticket cannot be confirmed
+back onto a seat that was given away. Then every remaining holder sends two cancels at once, to check
+that only one of them gives the seat back and queues the cancellation notice.
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from common import make_app, create_users, auth_header, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=2000)
+    parser.add_argument('--capacity', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--database-uri', default=None)
+    args = parser.parse_args()
+
+    from models import db, Event, EventSales, OutboxMessage, Ticket
+    from datetime import datetime
+
+    app = make_app(args.database_uri)
+    with app.app_context():
+        organizer, *buyers = create_users(args.buyers + 1)
+        event = Event(title='Hot sale', date=datetime(2030, 1, 1), location='Nairobi', price=0,
+                      capacity=args.capacity, creator_id=organizer)
+        db.session.add(event)
+        db.session.commit()
+        event_id = event.id
+        headers = [auth_header(b) for b in buyers]
+
+    def buy(header):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/tickets/', json={'event_id': event_id}, headers=header)
+        ticket_id = response.get_json()['ticket']['id'] if response.status_code == 201 else None
+        return response.status_code, time.perf_counter() - start, ticket_id
+
+    def cycle(header, ticket_id):
+        client = app.test_client()
+        return [client.patch(f'/tickets/{ticket_id}/{action}', headers=header).status_code
+                for action in ('cancel', 'confirm', 'cancel')]
+
+    def cancel(header, ticket_id):
+        return app.test_client().patch(f'/tickets/{ticket_id}/cancel', headers=header).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(buy, headers))
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [latency for _, latency, _ in results]
+    with app.app_context():
+        sold = db.session.get(Event, event_id).tickets_sold
+        issued = Ticket.query.filter_by(event_id=event_id).count()
+
+    holders = [(h, ticket_id) for h, (_, _, ticket_id) in zip(headers, results) if ticket_id][::2]
+    turned_away = [h for h, (status, _, _) in zip(headers, results) if status == 409]
+    with ThreadPoolExecutor(args.threads) as pool:
+        cycles = [pool.submit(cycle, h, ticket_id) for h, ticket_id in holders]
+        retries = [pool.submit(buy, h) for h in turned_away]
+        cycles, retries = [f.result() for f in cycles], [f.result() for f in retries]
+    with app.app_context():
+        resold = db.session.get(Event, event_id).tickets_sold
+        held = Ticket.query.filter(Ticket.event_id == event_id, Ticket.status != 'canceled').count()
+
+    with app.app_context():
+        remaining = [(h, ticket_id) for h, ticket_id in
+                     zip(headers, [ticket_id for _, _, ticket_id in results])
+                     if ticket_id and db.session.get(Ticket, ticket_id).status != 'canceled']
+        remaining += [(h, ticket_id) for h, (_, _, ticket_id) in zip(turned_away, retries) if ticket_id]
+    with ThreadPoolExecutor(args.threads) as pool:
+        doubles = list(pool.map(lambda pair: cancel(*pair), [pair for pair in remaining for _ in range(2)]))
+    with app.app_context():
+        drained = db.session.get(Event, event_id).tickets_sold
+        counts = db.session.get(EventSales, event_id)
+        live = counts.pending + counts.confirmed
+        notices = Counter(m.payload['ticket_id'] for m in OutboxMessage.query.filter_by(topic='ticket.canceled'))
+        canceled = Ticket.query.filter_by(event_id=event_id, status='canceled').count()
+
+    print(f"purchases: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.0f} req/s)")
+    print(f"statuses: {dict(statuses)}")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"capacity={args.capacity} tickets_sold={sold} tickets_issued={issued}")
+    print(f"cancel/confirm/cancel cycles: {dict(Counter(tuple(c) for c in cycles))}; "
+          f"retries: {dict(Counter(status for status, _, _ in retries))}")
+    print(f"after cycles: tickets_sold={resold} tickets_held={held}")
+    print(f"double cancels: {dict(Counter(doubles))}; after: tickets_sold={drained} sales_live={live} "
+          f"canceled={canceled} notices={sum(notices.values())}")
+
+    assert issued == sold, 'sold counter drifted from issued tickets'
+    assert issued <= args.capacity, 'event oversold'
+    assert statuses[201] == issued, 'a 201 was returned without a ticket'
+    assert all(c == [200, 409, 200] for c in cycles), 'a canceled ticket was confirmed again'
+    assert resold == held and 0 <= held <= args.capacity, 'cancel/confirm cycle corrupted the seat count'
+    assert all(status == 200 for status in doubles) and drained == 0 and live == 0, \
+        'a double cancel gave the same seat back twice'
+    assert len(notices) == canceled and set(notices.values()) == {1}, 'a cancellation notice was queued twice'
+    print('✅ no oversell')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Report hash and verify latency for each password hashing setting.
+
+Usage: python benchmarks/password_hashing.py [--rounds 20] [--method scrypt:16384:8:1 ...]
+"""
+import argparse
+import statistics
+import time
+
+from common import percentile
+from passwords import PasswordHasher
+
+DEFAULT_METHODS = [
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+]
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--method', action='append', dest='methods')
+    args = parser.parse_args()
+
+    print(f"{'method':<24} {'hash p50':>10} {'hash p99':>10} {'verify p50':>11} {'mean':>8}")
+    for method in args.methods or DEFAULT_METHODS:
+        hasher = PasswordHasher(method, workers=1)
+        stored = hasher.hash('correct horse battery staple')
+        hashes = timed(lambda: hasher.hash('correct horse battery staple'), args.rounds)
+        verifies = timed(lambda: hasher.verify(stored, 'correct horse battery staple'), args.rounds)
+        print(f"{method:<24} {percentile(hashes, 50):>8.1f}ms {percentile(hashes, 99):>8.1f}ms "
+              f"{percentile(verifies, 50):>9.1f}ms {statistics.mean(hashes):>6.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Bytes on the wire and server time for event lists: all fields vs the list view's fields, per encoding.
+
+Usage: python benchmarks/payload.py [--events 5000] [--repeat 5]
+
+Descriptions are a few hundred characters of random words, so compression ratios are closer to
+real text than to repeated filler. The response cache is off, so every request runs the query.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import make_app, create_users
+
+LIST_VIEW = 'id,title,date,location,price'
+WORDS = ('concert live music festival night open air stage food market workshop talk panel family '
+         'tickets early doors city park jazz tech startup art gallery film comedy dance club').split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from models import db, Event
+    import compression
+
+    app = make_app()
+    rng = random.Random(42)
+    with app.app_context():
+        users = create_users(50)
+        db.session.execute(Event.__table__.insert(), [{
+            'title': f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}',
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))),
+            'date': datetime(2030, 1, 1) + timedelta(hours=i), 'location': rng.choice(['Nairobi', 'Mombasa', 'Kisumu']),
+            'price': rng.choice([0, 100, 250, 500]), 'creator_id': rng.choice(users), 'created_at': datetime(2025, 1, 1),
+            'updated_at': datetime(2025, 1, 1), 'tickets_sold': 0,
+        } for i in range(args.events)])
+        db.session.commit()
+
+    client = app.test_client()
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli is not None else [])
+    print(f"{'request':<44} {'encoding':<9} {'bytes':>10} {'ms':>8}")
+    for label, url in [('page of 200, all fields', '/events/?limit=200'),
+                       ('page of 200, list view fields', f'/events/?limit=200&fields={LIST_VIEW}'),
+                       (f'stream of {args.events}, all fields', '/events/?stream=1'),
+                       (f'stream of {args.events}, list view fields', f'/events/?stream=1&fields={LIST_VIEW}')]:
+        for encoding in encodings:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get(url, headers={'Accept-Encoding': encoding})
+                body = response.get_data()
+                timings.append(time.perf_counter() - start)
+            assert response.status_code == 200 and response.headers.get('Content-Encoding', 'identity') == encoding
+            print(f"{label:<44} {encoding:<9} {len(body):>10,} {min(timings) * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Measure what rate limiting costs per request, for each limiter backend.
+
+Usage: python benchmarks/ratelimit.py [--checks 200000] [--requests 5000] [--keys 10000]
+
+First times bare limiter checks spread over --keys clients, then serves the same cheap request
+through the Flask test client with limiting off, per worker ('memory') and shared ('sqlite').
+Limits are set high enough that nothing is refused, so only the bookkeeping is measured.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from common import make_app, create_users, percentile
+
+HIGH_LIMIT = '1000000000/second'
+
+
+def time_checks(limiter, checks, keys):
+    started = time.perf_counter()
+    for i in range(checks):
+        limiter.hit(f'bench:10.0.{i % keys // 256}.{i % 256}', 1000000000, 1)
+    return (time.perf_counter() - started) / checks
+
+
+def time_requests(app, requests):
+    client = app.test_client()
+    for _ in range(200):  # warm up caches, connections and the limiter's storage
+        client.get('/events/1')
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/events/1')
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--keys', type=int, default=10000)
+    args = parser.parse_args()
+
+    from ratelimit import MemoryLimiter, SQLiteLimiter
+
+    path = os.path.join(tempfile.mkdtemp(prefix='eventhub-bench-'), 'ratelimit.db')
+    print(f"{'backend':<8} {'per check':>10}")
+    for name, limiter in (('memory', MemoryLimiter()), ('sqlite', SQLiteLimiter(path))):
+        print(f"{name:<8} {time_checks(limiter, args.checks, args.keys) * 1e6:>8.2f}µs")
+
+    print(f"\n{'limiter':<8} {'mean':>9} {'p50':>9} {'p99':>9} {'overhead':>9}")
+    database = os.path.join(tempfile.mkdtemp(prefix='eventhub-bench-'), 'bench.db')
+    baseline = None
+    for name, settings in (('off', {'RATELIMIT_ENABLED': False}),
+                           ('memory', {'RATELIMIT_ENABLED': True, 'RATELIMIT_BACKEND': 'memory'}),
+                           ('sqlite', {'RATELIMIT_ENABLED': True, 'RATELIMIT_BACKEND': 'sqlite',
+                                       'RATELIMIT_SQLITE_PATH': path})):
+        app = make_app('sqlite:///' + database, CACHE_BACKEND='memory', RATELIMITS={'events': HIGH_LIMIT}, **settings)
+        with app.app_context():
+            from models import db, Event
+            if not db.session.get(Event, 1):
+                create_users(1)
+                db.session.add(Event(title='Benchmark', date=datetime(2030, 1, 1), location='Nairobi', creator_id=1))
+                db.session.commit()
+        samples = time_requests(app, args.requests)
+        mean = sum(samples) / len(samples)
+        baseline = mean if baseline is None else baseline
+        print(f"{name:<8} {mean * 1e6:>7.1f}µs {percentile(samples, 50) * 1e6:>7.1f}µs "
+              f"{percentile(samples, 99) * 1e6:>7.1f}µs {(mean - baseline) * 1e6:>+7.1f}µs")
+
+
+if __name__ == '__main__':
+    main()
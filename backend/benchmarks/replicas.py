@@ -0,0 +1,72 @@
+"""Check read-replica routing on two SQLite files: where statements go, and read-your-writes.
+
+Usage: python benchmarks/replicas.py [--users 200] [--reads 20] [--sticky-seconds 1]
+
+The replica is a copy of the primary taken once, after setup, and never synced again, so it lags
+by everything written during the run. Each user buys a ticket and immediately lists their
+tickets, which must include it (the read stays on the primary); anonymous catalogue reads must go
+to the replica. After the sticky window the same user's list goes back to the stale replica.
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event as sa_event
+
+from common import make_app, create_users, auth_header
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--reads', type=int, default=20, help='anonymous GET /events per user')
+    parser.add_argument('--sticky-seconds', type=float, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='eventhub-bench-')
+    primary, replica = (f"sqlite:///{os.path.join(directory, name)}" for name in ('primary.db', 'replica.db'))
+    app = make_app(primary, SQLALCHEMY_REPLICA_URIS=[replica], REPLICA_STICKY_SECONDS=args.sticky_seconds,
+                   REPLICA_STICKY_LOCAL=True, OUTBOX_WORKERS=0)
+
+    from models import db, Event
+    import replicas
+
+    with app.app_context():
+        users = create_users(args.users)
+        db.session.add(Event(title='Replicated', date=datetime(2030, 1, 1), location='Nairobi', price=0, creator_id=1))
+        db.session.commit()
+        event_id = db.session.scalar(db.select(Event.id))
+        headers = {u: auth_header(u) for u in users}
+        db.session.close()
+        replicas.sync_sqlite(primary, replica)
+        statements = Counter()
+        for key, engine in db.engines.items():
+            sa_event.listen(engine, 'before_cursor_execute', lambda *a, key=key or 'primary': statements.update([key]))
+
+    time.sleep(args.sticky_seconds)  # the tokens must be older than the window, or every read sticks
+    client = app.test_client()
+    stale = 0
+    for user in users:
+        assert client.post('/tickets/', json={'event_id': event_id}, headers=headers[user]).status_code == 201
+        stale += not client.get('/tickets/my', headers=headers[user]).get_json()['tickets']
+        for _ in range(args.reads):
+            assert client.get('/events/').status_code == 200
+    writes = dict(statements)
+
+    time.sleep(args.sticky_seconds)
+    statements.clear()
+    lagging = sum(not client.get('/tickets/my', headers=headers[u]).get_json()['tickets'] for u in users)
+
+    total = sum(writes.values())
+    print("statements during the run: " + ', '.join(f"{k} {n} ({n / total:.0%})" for k, n in sorted(writes.items())))
+    print(f"reads right after a purchase missing the ticket: {stale} of {len(users)}"
+          f" {'✅' if not stale else '❌'}")
+    print(f"reads after the sticky window served by the (unsynced) replica: "
+          f"{statements.get('replica0', 0)} statements, {lagging} of {len(users)} lists still without the ticket")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Cost of checking tokens against the revocation list: in-memory copy vs a query per request.
+
+Usage: python benchmarks/revocation.py [--revocations 100000] [--requests 2000] [--sync-seconds 1]
+
+Fills token_revocations with unexpired rows and then reports:
+- the cost of one check against the worker's copy and of one primary-key SELECT (the naive check)
+- the initial load and an incremental sync
+- how many statements authenticated requests sent to token_revocations while the copy synced
+  every --sync-seconds
+"""
+import argparse
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event, select
+
+from common import make_app, create_users, auth_header
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--revocations', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sync-seconds', type=float, default=1)
+    args = parser.parse_args()
+
+    app = make_app(OUTBOX_WORKERS=0, REVOCATION_SYNC_SECONDS=args.sync_seconds)
+
+    from models import db, TokenRevocation
+    from revocation import Blocklist
+    import revocation
+
+    with app.app_context():
+        user, = create_users(1)
+        now, expires = datetime.utcnow(), datetime.utcnow() + timedelta(days=30)
+        jtis = [str(uuid.uuid4()) for _ in range(args.revocations)]
+        for start in range(0, len(jtis), 10000):
+            db.session.execute(TokenRevocation.__table__.insert(), [
+                {'jti': jti, 'token_type': 'refresh', 'user_id': user, 'expires_at': expires,
+                 'revoked_at': now - timedelta(days=30) * (i / len(jtis))}  # revoked over the past month
+                for i, jti in enumerate(jtis[start:start + 10000], start)])
+        db.session.commit()
+
+        blocklist = Blocklist(app)
+        started = time.perf_counter()
+        blocklist.sync()
+        load = time.perf_counter() - started
+        revocation.revoke({'jti': str(uuid.uuid4()), 'type': 'access', 'sub': user, 'exp': expires.timestamp()})
+        blocklist._next_sync = 0
+        started = time.perf_counter()
+        blocklist.sync()
+        incremental = time.perf_counter() - started
+
+        probe = jtis[len(jtis) // 2]
+        in_memory = per_call(lambda: probe in blocklist, 100000)
+        lookup = select(TokenRevocation.jti).where(TokenRevocation.jti == probe)
+        query = per_call(lambda: db.session.execute(lookup).first(), 2000)
+        header = auth_header(user)
+
+    statements = Counter()
+    with app.app_context():
+        sa_event.listen(db.engine, 'before_cursor_execute',
+                        lambda conn, cursor, statement, *a: statements.update([statement.split()[0]])
+                        if 'token_revocations' in statement else None)
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        assert client.get('/tickets/my', headers=header).status_code == 200
+    elapsed = time.perf_counter() - started
+
+    print(f"revocations: {args.revocations:,} (copy holds {len(blocklist):,})")
+    print(f"initial load {load * 1000:.0f}ms, incremental sync {incremental * 1000:.1f}ms")
+    print(f"check: in memory {in_memory * 1e6:.2f}µs, SELECT by jti {query * 1e6:.0f}µs")
+    print(f"{args.requests} authenticated requests in {elapsed:.1f}s sent {sum(statements.values())} statements"
+          f" to token_revocations (syncing every {args.sync_seconds}s)")
+
+
+if __name__ == '__main__':
+    main()
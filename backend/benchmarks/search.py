@@ -0,0 +1,101 @@
+"""Time GET /events/search over a large generated catalogue.
+
+Usage: python benchmarks/search.py [--events 100000] [--queries 2000] [--database-uri URI]
+
+Titles and descriptions are drawn from a Zipf-distributed vocabulary whose most frequent words
+are English stopwords, so, as in real text, common words match a large share of the catalogue.
+Query words come from the same distribution. The report separates one- and two-word queries and
+gives both the SQL time and the end-to-end request time, flagging a SQL p99 above 10ms.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import event as sa_event
+
+from common import make_app, create_users, percentile
+
+CHUNK = 20000
+TARGET_MS = 10.0
+LOCATIONS = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Malindi', 'Naivasha']
+
+
+def vocabulary(size, rng):
+    """Words by descending frequency: stopwords first, as in real text, then made-up words"""
+    from search import STOPWORDS
+
+    syllables = ['ka', 'lo', 'mi', 'su', 'ta', 're', 'no', 'vi', 'ze', 'pa', 'do', 'ge', 'fu', 'ri', 'ba', 'ne']
+    words = set()
+    while len(words) < size - len(STOPWORDS):
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(STOPWORDS) + rng.sample(sorted(words), len(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--database-uri', default=None)
+    args = parser.parse_args()
+
+    from models import db, Event
+    import search
+
+    rng = random.Random(7)
+    words = vocabulary(args.vocabulary, rng)
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(words))))
+    pick = lambda k: ' '.join(rng.choices(words, cum_weights=weights, k=k))
+
+    app = make_app(args.database_uri)
+    with app.app_context():
+        started = time.perf_counter()
+        create_users(100)
+        base = datetime(2025, 1, 1)
+        for start in range(0, args.events, CHUNK):
+            db.session.execute(Event.__table__.insert(), [{
+                'title': pick(4).title(), 'description': pick(30), 'location': rng.choice(LOCATIONS),
+                'date': base + timedelta(hours=i), 'price': 0, 'creator_id': i % 100 + 1, 'tickets_sold': 0,
+            } for i in range(start, min(start + CHUNK, args.events))])
+            db.session.commit()
+        count = search.rebuild(db.session.connection())
+        db.session.commit()
+        print(f"indexed {count} events in {time.perf_counter() - started:.1f}s")
+
+    sql_time = [0.0]
+    with app.app_context():
+        sa_event.listen(db.engine, 'before_cursor_execute', lambda *a: sql_time.append(time.perf_counter()))
+        sa_event.listen(db.engine, 'after_cursor_execute',
+                        lambda *a: sql_time.__setitem__(0, sql_time[0] + time.perf_counter() - sql_time.pop()))
+
+    client = app.test_client()
+    samples = {1: [], 2: []}
+    sql_samples = {1: [], 2: []}
+    matched = {1: 0, 2: 0}
+    for _ in range(args.queries):
+        terms = rng.choice((1, 2))
+        path = f'/events/search?q={pick(terms)}'
+        sql_time[0] = 0.0
+        start = time.perf_counter()
+        response = client.get(path)
+        samples[terms].append(time.perf_counter() - start)
+        sql_samples[terms].append(sql_time[0])
+        assert response.status_code == 200, response.get_data(as_text=True)
+        matched[terms] += bool(response.get_json()['events'])
+
+    print(f"\n{'query':<8} {'count':>6} {'hits':>6}   {'SQL p50':>8} {'p95':>8} {'p99':>8}   {'request p50':>11} {'p95':>8} {'p99':>8}")
+    slow = False
+    for terms, latencies in samples.items():
+        sql = sql_samples[terms]
+        slow |= percentile(sql, 99) * 1000 > TARGET_MS
+        print(f"{f'{terms} word':<8} {len(latencies):>6} {matched[terms]:>6}   "
+              + ' '.join(f"{percentile(sql, p) * 1000:>6.2f}ms" for p in (50, 95, 99)) + '   '
+              + f"{percentile(latencies, 50) * 1000:>9.2f}ms "
+              + ' '.join(f"{percentile(latencies, p) * 1000:>6.2f}ms" for p in (95, 99)))
+    print(f"\nSQL p99 {'exceeds' if slow else 'is within'} the {TARGET_MS:.0f}ms target")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Per-row cost of building and encoding event list payloads, ORM to_dict() vs projected rows.
+
+Usage: python benchmarks/serialization.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import joinedload
+
+from common import make_app, create_users
+from serialization import JSONProvider
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from models import db, Event
+
+    app = make_app()
+    stdlib = DefaultJSONProvider(app)
+    stdlib_iso = JSONProvider(app)
+    stdlib_iso.fast = False
+    fast = JSONProvider(app)
+
+    with app.app_context():
+        creators = create_users(100)
+        db.session.execute(Event.__table__.insert(), [{
+            'title': f'Event {i}', 'description': 'An evening of live music and food. ' * 3,
+            'date': datetime(2030, 1, 1) + timedelta(hours=i), 'location': 'Nairobi', 'price': 500.0,
+            'creator_id': creators[i % len(creators)], 'created_at': datetime(2029, 1, 1), 'tickets_sold': 0,
+        } for i in range(args.rows)])
+        db.session.commit()
+
+        def orm_payload():
+            db.session.expunge_all()
+            events = Event.query.options(joinedload(Event.creator)).order_by(Event.date, Event.id).all()
+            return {'events': [e.to_dict(include_creator=True) for e in events]}
+
+        def row_payload():
+            rows = Event.row_query(include_creator=True).order_by(Event.date, Event.id).all()
+            return {'events': [Event.row_to_dict(r) for r in rows]}
+
+        # The list rows leave out tickets_sold (see Event.FIELDS); everything else must match to_dict()
+        orm_rows = json.loads(fast.dumps(orm_payload()))
+        for e in orm_rows['events']: e.pop('tickets_sold')
+        assert orm_rows == json.loads(fast.dumps(row_payload())), 'payloads differ'
+        assert json.loads(stdlib_iso.dumps(row_payload())) == json.loads(fast.dumps(row_payload())), 'encoders differ'
+
+        orm_built, row_built = orm_payload(), row_payload()
+        cases = [
+            ('ORM to_dict() + stdlib json', lambda: stdlib.dumps(orm_payload())),
+            (f"ORM to_dict() + {'orjson' if fast.fast else 'stdlib (orjson missing)'}", lambda: fast.dumps(orm_payload())),
+            ('projected rows + stdlib json', lambda: stdlib_iso.dumps(row_payload())),
+            (f"projected rows + {'orjson' if fast.fast else 'stdlib (orjson missing)'}", lambda: fast.dumps(row_payload())),
+            ('  encode only, stdlib json', lambda: stdlib.dumps(orm_built)),
+            ('  encode only, provider', lambda: fast.dumps(row_built)),
+            # What jsonify() runs: response() passes separators=(',', ':') outside debug mode
+            ('  jsonify response, stdlib json', lambda: stdlib.response(orm_built)),
+            ('  jsonify response, provider', lambda: fast.response(row_built)),
+        ]
+        print(f"{args.rows} events, best of {args.repeat}")
+        print(f"{'path':<40} {'total':>9} {'per row':>9}")
+        for name, fn in cases:
+            elapsed = best_of(args.repeat, fn)
+            print(f"{name:<40} {elapsed * 1000:>7.1f}ms {elapsed / args.rows * 1e6:>7.2f}µs")
+
+
+if __name__ == '__main__':
+    main()
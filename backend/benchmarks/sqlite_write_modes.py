@@ -0,0 +1,71 @@
+"""Compare concurrent write throughput of SQLite journal modes through POST /events.
+
+Usage: python benchmarks/sqlite_write_modes.py [--writes 2000] [--threads 16] [--readers 4]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import make_app, create_users, auth_header, percentile
+
+MODES = {
+    'rollback journal, synchronous=FULL': {'SQLITE_WAL': False, 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'WAL, synchronous=FULL': {'SQLITE_WAL': True, 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'WAL, synchronous=NORMAL': {'SQLITE_WAL': True, 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+
+
+def run(settings, writes, threads, readers):
+    app = make_app(**settings)
+    with app.app_context():
+        headers = [auth_header(u) for u in create_users(threads)]
+
+    stop = threading.Event()
+    reads = []
+
+    def read_loop():
+        client = app.test_client()
+        while not stop.is_set():
+            client.get('/events/?limit=20')
+            reads.append(1)
+
+    def write(i):
+        client = app.test_client()
+        start = time.perf_counter()
+        status = client.post('/events', headers=headers[i % threads], json={
+            'title': f'Event {i}', 'date': '2030-01-01T18:00:00', 'location': 'Nairobi', 'price': 100,
+        }).status_code
+        return status, time.perf_counter() - start
+
+    reader_threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    for t in reader_threads:
+        t.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(write, range(writes)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in reader_threads:
+        t.join()
+
+    latencies = [latency for status, latency in results if status == 201]
+    errors = sum(1 for status, _ in results if status != 201)
+    return len(latencies) / elapsed, len(reads) / elapsed, percentile(latencies, 99) * 1000, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':<36} {'writes/s':>9} {'reads/s':>8} {'write p99':>10} {'errors':>7}")
+    for name, settings in MODES.items():
+        wps, rps, p99, errors = run(settings, args.writes, args.threads, args.readers)
+        print(f"{name:<36} {wps:>9.0f} {rps:>8.0f} {p99:>8.1f}ms {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
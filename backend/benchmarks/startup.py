@@ -0,0 +1,62 @@
+"""Time what a fresh worker pays before it can serve: importing the app and calling create_app().
+
+Usage: python benchmarks/startup.py [--runs 20]
+
+Each run is a new Python process, as after a gunicorn worker (re)start without --preload. The
+'+ migrate' row also imports Flask-Migrate and registers it the way the CLI does, which is what
+every worker paid before the migration commands were loaded lazily.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import percentile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('production')
+if {migrate}:
+    from flask_migrate import Migrate
+    from models import db
+    Migrate(app, db)
+created = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'create_app': created - imported, 'modules': len(sys.modules),
+                  'alembic': 'alembic' in sys.modules}}))
+"""
+
+
+def run(migrate):
+    env = {**os.environ, 'DATABASE_URL': 'sqlite://'}
+    output = subprocess.run([sys.executable, '-c', PROBE.format(migrate=migrate)], cwd=BACKEND, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'app':<10} {'import p50':>10} {'p95':>8} {'create_app p50':>14} {'p95':>8} {'total p50':>10} "
+          f"{'modules':>8} {'alembic':>8}")
+    for name, migrate in (('lazy', False), ('+ migrate', True)):
+        run(migrate)  # warm the bytecode and filesystem caches
+        results = [run(migrate) for _ in range(args.runs)]
+        imports = [r['import'] for r in results]
+        creates = [r['create_app'] for r in results]
+        totals = [r['import'] + r['create_app'] for r in results]
+        print(f"{name:<10} "
+              + ' '.join(f"{percentile(imports, p) * 1000:>{w}.1f}ms" for p, w in ((50, 8), (95, 6))) + ' '
+              + ' '.join(f"{percentile(creates, p) * 1000:>{w}.1f}ms" for p, w in ((50, 12), (95, 6))) + ' '
+              + f"{percentile(totals, 50) * 1000:>8.1f}ms {results[-1]['modules']:>8} {str(results[-1]['alembic']):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+
+class MemoryCache:
+    """In-process cache with per-entry TTL and LRU eviction once `max_entries` is reached.
+
+    With `max_entries=None` nothing is evicted: entries stay until they expire, and expired ones
+    are dropped from the least recently used end as new entries come in.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=30):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if self.max_entries is None:
+                self._drop_expired()
+            else:
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        while self._data:
+            expires_at = next(iter(self._data.values()))[1]
+            if expires_at is None or expires_at > now:
+                break
+            self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Cache backed by any client speaking the Redis GET/SET/DEL commands.
+
+    Values are stored as `etag\\nbody` bytes so they survive the round trip unchanged.
+    """
+
+    def __init__(self, client, prefix='eventhub:', default_ttl=30):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            raw = raw.encode()
+        etag, body = raw.split(b'\n', 1)
+        return etag.decode(), body
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        etag, body = value
+        self.client.set(self.prefix + key, etag.encode() + b'\n' + body, ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + k for k in keys])
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class NullCache:
+    """Backend that never stores anything; used when CACHE_BACKEND is 'null'"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+def make_store(app, name, max_entries, default_ttl):
+    """A store of its own for records that must not be evicted by response-cache traffic.
+
+    With a Redis response cache it is the same Redis under its own prefix, so every worker sees
+    the records. Otherwise it is a MemoryCache in this process holding up to `max_entries`
+    (None: no limit, entries leave when they expire).
+    """
+    backend = app.extensions['cache']
+    if isinstance(backend, RedisCache):
+        return RedisCache(backend.client, prefix=f'{backend.prefix}{name}:', default_ttl=default_ttl)
+    return MemoryCache(max_entries, default_ttl)
+
+
+class ResponseCache:
+    """Caches rendered JSON responses and answers If-None-Match with 304"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, backend=None):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_DEFAULT_TTL', 30)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_REDIS_URL', None)
+        app.extensions['cache'] = backend or self._make_backend(app.config)
+
+    @staticmethod
+    def _make_backend(cfg):
+        kind = cfg['CACHE_BACKEND']
+        if kind == 'memory':
+            return MemoryCache(cfg['CACHE_MAX_ENTRIES'], cfg['CACHE_DEFAULT_TTL'])
+        if kind == 'redis':
+            import redis  # optional dependency, only needed for the shared backend
+            return RedisCache(redis.Redis.from_url(cfg['CACHE_REDIS_URL']), default_ttl=cfg['CACHE_DEFAULT_TTL'])
+        if kind == 'null':
+            return NullCache()
+        raise ValueError(f'Unknown CACHE_BACKEND {kind!r}')
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def cached_json(self, key_func, ttl=None):
+        """Cache a view's 200 JSON body under `key_func(**view_args)` and serve it with an ETag"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = key_func(**kwargs)
+                hit = self.backend.get(key)
+                if hit is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    hit = (hashlib.sha1(body).hexdigest(), body)
+                    self.backend.set(key, hit, ttl)
+                    response.set_etag(hit[0])
+                else:
+                    response = current_app.response_class(hit[1], mimetype='application/json')
+                    response.set_etag(hit[0])
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+
+cache = ResponseCache()
@@ -0,0 +1,94 @@
+"""Change versions for the event catalogue.
+
+Every write that changes an event's list row takes the next catalogue version from a single
+counter row and stamps it on the event (or, for deletes, on a tombstone). Seat counts stay off the
+counter: ticket purchases and cancellations would otherwise all queue on its row, so tickets_sold
+is only served on the event's own page. Bumping the
+counter locks its row until commit, so versions become visible in commit order and a client that
+has seen version N only ever needs the rows stamped after N. The counter also gives the event
+lists a cheap ETag/Last-Modified: one primary-key read, no matter how big the catalogue is.
+"""
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, request
+from sqlalchemy import delete, event, insert, select, update
+from werkzeug.http import is_resource_modified
+
+from models import db, Event, EventCatalogue, EventTombstone
+
+CATALOGUE_ID = 1
+
+
+@event.listens_for(EventCatalogue.__table__, 'after_create')
+def create_counter(target, connection, **kw):
+    connection.execute(insert(target).values(id=CATALOGUE_ID, version=0, updated_at=datetime.utcnow()))
+
+
+def current(session=None):
+    """(version, updated_at) of the catalogue"""
+    session = session or db.session
+    return session.execute(select(EventCatalogue.version, EventCatalogue.updated_at)
+                           .where(EventCatalogue.id == CATALOGUE_ID)).one()
+
+
+def next_version(session=None):
+    """Bump the catalogue version in the current transaction and return it"""
+    session = session or db.session
+    session.execute(update(EventCatalogue)
+                    .where(EventCatalogue.id == CATALOGUE_ID)
+                    .values(version=EventCatalogue.version + 1, updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False))
+    return session.execute(select(EventCatalogue.version).where(EventCatalogue.id == CATALOGUE_ID)).scalar_one()
+
+
+def touch(*criteria, session=None):
+    """Stamp a new version on the events matching `criteria`, e.g. when their creator is renamed"""
+    session = session or db.session
+    session.execute(update(Event).where(*criteria).values(version=next_version(session))
+                    .execution_options(synchronize_session=False))
+
+
+def tombstone(event_id, session=None):
+    """Record the deletion of `event_id`; call in the transaction that deletes it"""
+    session = session or db.session
+    version = next_version(session)
+    with session.no_autoflush:
+        session.merge(EventTombstone(event_id=event_id, version=version, deleted_at=datetime.utcnow()))
+    return version
+
+
+def tombstone_many(event_ids, session=None):
+    """tombstone() for many events under one version, in two statements"""
+    session = session or db.session
+    version = next_version(session)
+    session.execute(delete(EventTombstone).where(EventTombstone.event_id.in_(event_ids)))
+    now = datetime.utcnow()
+    session.execute(insert(EventTombstone), [{'event_id': i, 'version': version, 'deleted_at': now} for i in event_ids])
+    return version
+
+
+def etag(version):
+    return f'catalogue-{version}'
+
+
+def conditional(view):
+    """Answer If-None-Match / If-Modified-Since on a catalogue view from the counter row alone.
+
+    The version read here is kept in `g.catalogue_version` for cache keys and change feeds; it is
+    read before the view runs, so a response never claims a newer version than its rows.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, updated_at = current()
+        g.catalogue_version = version
+        if is_resource_modified(request.environ, etag=etag(version), last_modified=updated_at):
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        else:
+            response = current_app.response_class(status=304)
+        response.set_etag(etag(version))
+        response.last_modified = updated_at
+        return response
+    return wrapper
@@ -0,0 +1,60 @@
+"""Command groups for `flask ...` that are only imported when the CLI actually uses them.
+
+create_app() runs in every gunicorn worker, and Flask-Migrate alone pulls in Alembic, about half
+of the app's import time. The groups registered here stand in for the real ones: listing them
+(`flask --help`) costs nothing, and the real group is imported the first time one of its
+commands is looked up.
+"""
+import click
+from flask import current_app
+
+from models import db
+
+
+class LazyGroup(click.Group):
+    """Stands in for the group returned by `load()`, which is called when the group is first run"""
+
+    def __init__(self, name, load, **kwargs):
+        super().__init__(name, **kwargs)
+        self._load = load
+        self._group = None
+
+    @property
+    def group(self):
+        if self._group is None:
+            self._group = self._load()
+        return self._group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # The real group parses its own options and runs its own callback
+        return self.group.make_context(info_name, args, parent=parent, **extra)
+
+    def list_commands(self, ctx):
+        return self.group.list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.group.get_command(ctx, name)
+
+
+def load_migrate():
+    from flask_migrate import Migrate
+    from flask_migrate.cli import db as db_cli
+
+    Migrate(current_app._get_current_object(), db)
+    return db_cli
+
+
+def load_data():
+    from commands import data_cli
+    return data_cli
+
+
+def load_outbox():
+    from commands import outbox_cli
+    return outbox_cli
+
+
+def init_app(app):
+    app.cli.add_command(LazyGroup('db', load_migrate, help='Perform database migrations.'))
+    app.cli.add_command(LazyGroup('data', load_data, help='Bulk-load users, events and tickets.'))
+    app.cli.add_command(LazyGroup('outbox', load_outbox, help='Inspect and drain the background work queue.'))
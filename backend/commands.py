@@ -0,0 +1,302 @@
+import csv
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import DateTime, Float, Integer, delete, func, select
+
+from models import db, User, Event, Ticket, OutboxMessage
+from passwords import PasswordHasher
+import archive
+import catalogue
+import outbox
+import replicas
+import revocation
+import sales
+import search
+
+data_cli = AppGroup('data', help='Bulk-load users, events and tickets.')
+outbox_cli = AppGroup('outbox', help='Inspect and drain the background work queue.')
+
+TABLES = {'users': User.__table__, 'events': Event.__table__, 'tickets': Ticket.__table__}
+LOCATIONS = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Malindi', 'Naivasha']
+
+
+class Loader:
+    """Inserts row dicts with Core executemany on one connection, a transaction per chunk.
+
+    With defer_indexes the model-declared secondary indexes are dropped up front and rebuilt once
+    at the end, which is much cheaper than maintaining them row by row.
+    """
+
+    def __init__(self, chunk_size, defer_indexes):
+        self.chunk_size = chunk_size
+        self.defer_indexes = defer_indexes
+        self.dropped = []
+        self.connection = None
+
+    def __enter__(self):
+        self.connection = db.engine.connect()
+        if self.connection.dialect.name == 'sqlite':
+            # Durability is pointless mid-load: a crash means reloading anyway
+            self.connection.exec_driver_sql('PRAGMA synchronous = OFF')
+            self.connection.exec_driver_sql('PRAGMA cache_size = -200000')
+            self.connection.exec_driver_sql('PRAGMA temp_store = MEMORY')
+        self.connection.commit()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.rebuild_indexes()
+        finally:
+            if self.connection.dialect.name == 'sqlite':
+                self.connection.exec_driver_sql(f"PRAGMA synchronous = {current_app.config['SQLITE_SYNCHRONOUS']}")
+            self.connection.close()
+
+    def rebuild_indexes(self):
+        if not self.dropped:
+            return
+        started = time.perf_counter()
+        for index in self.dropped:
+            index.create(self.connection)
+        self.connection.commit()
+        click.echo(f"rebuilt {len(self.dropped)} indexes in {time.perf_counter() - started:.1f}s")
+        self.dropped = []
+
+    def drop_indexes(self, table):
+        if not self.defer_indexes:
+            return
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if not index.unique and index not in self.dropped:
+                index.drop(self.connection, checkfirst=True)
+                self.dropped.append(index)
+        self.connection.commit()
+
+    def load(self, table, rows):
+        """Insert an iterable of dicts into `table`; returns the number of rows written"""
+        self.drop_indexes(table)
+        total = 0
+        started = time.perf_counter()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.connection.execute(table.insert(), chunk)
+            self.connection.commit()
+            total += len(chunk)
+        elapsed = time.perf_counter() - started
+        click.echo(f"{table.name}: {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
+        return total
+
+    def next_id(self, table):
+        return (self.connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+    def recount_tickets_sold(self):
+        """Resync events.tickets_sold and the sales aggregates, stamping events loaded without a
+        version with one new catalogue version; rebuilds deferred indexes first"""
+        self.rebuild_indexes()
+        events = Event.__table__
+        self.connection.execute(
+            events.update().values(updated_at=events.c.updated_at, tickets_sold=select(
+                func.count()).where(Ticket.event_id == Event.id, Ticket.status != 'canceled').scalar_subquery()))
+        if self.connection.execute(select(events.c.id).where(events.c.version == 0).limit(1)).first():
+            self.connection.execute(events.update().where(events.c.version == 0)
+                                    .values(version=catalogue.next_version(self.connection)))
+        self.connection.commit()
+        sales.rebuild(self.connection)
+        self.connection.commit()
+
+    def reindex_search(self):
+        started = time.perf_counter()
+        count = search.rebuild(self.connection)
+        self.connection.commit()
+        click.echo(f"search index: {count} events in {time.perf_counter() - started:.1f}s")
+
+
+def read_records(path):
+    """Yield dicts from a .csv or .jsonl file without loading it into memory"""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def coerce(table, record, password_hash):
+    """Convert text values to column types and hash a plaintext `password` if one is given"""
+    row = {}
+    for key, value in record.items():
+        if key == 'password' and table is User.__table__:
+            row['password_hash'] = password_hash(value)
+            continue
+        column = table.c.get(key)
+        if column is None:
+            raise click.BadParameter(f'{table.name} has no column {key!r}')
+        if value in ('', None):
+            value = None
+        elif isinstance(column.type, DateTime) and isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        elif isinstance(column.type, Integer):
+            value = int(value)
+        elif isinstance(column.type, Float):
+            value = float(value)
+        row[key] = value
+    return row
+
+
+@data_cli.command('import')
+@click.argument('table', type=click.Choice(list(TABLES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=50000, show_default=True)
+@click.option('--defer-indexes/--keep-indexes', default=True, show_default=True)
+@click.option('--password-hash-method', default=None,
+              help='Method for plaintext `password` values (default PASSWORD_HASH_METHOD); '
+                   'cheaper hashes are upgraded on each user\'s next login.')
+def import_command(table, path, chunk_size, defer_indexes, password_hash_method):
+    """Stream TABLE rows from a CSV or JSONL file. Columns match the table; users may give `password`."""
+    target = TABLES[table]
+    password_hash = PasswordHasher(password_hash_method or current_app.config['PASSWORD_HASH_METHOD'], workers=1).hash
+    with Loader(chunk_size, defer_indexes) as loader:
+        loader.load(target, (coerce(target, r, password_hash) for r in read_records(path)))
+        if table in ('events', 'tickets'):
+            loader.recount_tickets_sold()
+        if table == 'events':
+            loader.reindex_search()
+
+
+@data_cli.command('generate')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--events', default=10000, show_default=True)
+@click.option('--tickets', default=1000000, show_default=True)
+@click.option('--chunk-size', default=50000, show_default=True)
+@click.option('--defer-indexes/--keep-indexes', default=True, show_default=True)
+@click.option('--seed', default=42, show_default=True)
+def generate_command(users, events, tickets, chunk_size, defer_indexes, seed):
+    """Append synthetic users (password: "password"), events and tickets for staging and benchmarks."""
+    if tickets and (not users or not events):
+        raise click.UsageError('tickets need at least one generated user and event')
+    per_user = -(-tickets // users) if users else 0
+    if per_user > events:
+        raise click.UsageError(f'{tickets} tickets need at least {per_user} events for unique user/event pairs')
+    rng = random.Random(seed)
+    password_hash = PasswordHasher(current_app.config['PASSWORD_HASH_METHOD'], workers=1).hash('password')
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    with Loader(chunk_size, defer_indexes) as loader:
+        first_user, first_event = loader.next_id(User.__table__), loader.next_id(Event.__table__)
+        suffix = f'{seed}-{first_user}'
+        loader.load(User.__table__, ({
+            'id': first_user + i, 'username': f'user{i}-{suffix}', 'email': f'user{i}-{suffix}@example.com',
+            'password_hash': password_hash, 'created_at': now,
+        } for i in range(users)))
+        loader.load(Event.__table__, ({
+            'id': first_event + i, 'title': f'Event {i}', 'description': f'Generated event {i}',
+            'date': now + timedelta(hours=i), 'location': rng.choice(LOCATIONS),
+            'price': rng.choice([0, 100, 250, 500, 1000]), 'creator_id': first_user + i % users,
+            'created_at': now, 'tickets_sold': 0,
+        } for i in range(events if users else 0)))
+        # Ticket i goes to user i % users on distinct events, so unique_user_event always holds
+        stride = events // per_user if per_user else 0
+        loader.load(Ticket.__table__, ({
+            'user_id': first_user + i % users, 'event_id': first_event + ((i // users) * stride + i % users) % events,
+            'status': 'confirmed', 'payment_status': 'paid', 'created_at': now, 'updated_at': now,
+        } for i in range(tickets)))
+        loader.recount_tickets_sold()
+        loader.reindex_search()
+    click.echo(f"done in {time.perf_counter() - started:.1f}s")
+
+
+@data_cli.command('reconcile-sales')
+def reconcile_sales_command():
+    """Rebuild event_sales from tickets in one GROUP BY pass."""
+    started = time.perf_counter()
+    count = sales.rebuild(db.session)
+    db.session.commit()
+    click.echo(f"event_sales: rebuilt {count} events in {time.perf_counter() - started:.1f}s")
+
+
+@data_cli.command('reindex-search')
+def reindex_search_command():
+    """Rebuild the event full-text search index from the events table."""
+    started = time.perf_counter()
+    count = search.rebuild(db.session.connection())
+    db.session.commit()
+    click.echo(f"search index: {count} events in {time.perf_counter() - started:.1f}s")
+
+
+
+@data_cli.command('sync-replicas')
+def sync_replicas_command():
+    """Copy the SQLite primary onto each SQLite replica in SQLALCHEMY_REPLICA_URIS (local testing)."""
+    uris = current_app.config['SQLALCHEMY_REPLICA_URIS']
+    if not uris:
+        raise click.UsageError('No replicas configured; set DATABASE_REPLICA_URLS')
+    for uri in uris:
+        try:
+            replicas.sync_sqlite(current_app.config['SQLALCHEMY_DATABASE_URI'], uri)
+        except ValueError as e:
+            raise click.UsageError(f'{uri}: {e}')
+        click.echo(f"synced {uri}")
+
+
+@data_cli.command('archive')
+@click.option('--days', type=int, default=None, help='Archive events dated more than this many days ago '
+                                                     '(default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', default=None, type=int, help='Events per transaction (default ARCHIVE_BATCH_SIZE).')
+@click.option('--max-batches', default=None, type=int, help='Stop after this many batches.')
+@click.option('--export', type=click.Path(dir_okay=False), default=None,
+              help='Also append the archived events and their tickets to this gzipped JSONL file.')
+def archive_command(days, batch_size, max_batches, export):
+    """Move past events and their tickets into the archive tables, one bounded batch at a time."""
+    before = archive.cutoff(days)
+    started = time.perf_counter()
+    events, tickets = archive.archive(
+        before, batch_size or current_app.config['ARCHIVE_BATCH_SIZE'], max_batches, export,
+        on_batch=lambda moved, elapsed: click.echo(f"  {moved[0]} events, {moved[1]} tickets in {elapsed:.2f}s"))
+    click.echo(f"archived {events} events and {tickets} tickets dated before {before:%Y-%m-%d %H:%M} "
+               f"in {time.perf_counter() - started:.1f}s")
+
+
+@data_cli.command('purge-revocations')
+def purge_revocations_command():
+    """Delete revoked-token rows whose tokens have expired anyway."""
+    click.echo(f"purged {revocation.purge()} expired token revocations")
+
+@outbox_cli.command('drain')
+@click.option('--include-delayed', is_flag=True, help='Also retry right away the messages waiting out a backoff.')
+def drain_outbox_command(include_delayed):
+    """Process every due outbox message in this process, e.g. before a deploy or with OUTBOX_WORKERS=0."""
+    started = time.perf_counter()
+    succeeded, failed = outbox.drain(include_delayed)
+    click.echo(f"outbox: {succeeded} processed, {failed} failed in {time.perf_counter() - started:.1f}s")
+    click.echo(' '.join(f'{status}={count}' for status, count in outbox.counts().items()))
+
+
+@outbox_cli.command('status')
+def outbox_status_command():
+    """Count outbox messages by status and show the most recent failures."""
+    click.echo(' '.join(f'{status}={count}' for status, count in outbox.counts().items()))
+    failing = db.session.execute(
+        select(OutboxMessage.id, OutboxMessage.topic, OutboxMessage.status, OutboxMessage.attempts, OutboxMessage.last_error)
+        .where(OutboxMessage.last_error.is_not(None)).order_by(OutboxMessage.id.desc()).limit(10))
+    for row in failing:
+        click.echo(f"#{row.id} {row.topic} {row.status} after {row.attempts} attempts: {row.last_error}")
+
+
+@outbox_cli.command('purge')
+@click.option('--days', default=7, show_default=True, help='Keep processed messages this many days.')
+def purge_outbox_command(days):
+    """Delete processed (done) messages older than --days; dead messages are kept for inspection."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = db.session.execute(delete(OutboxMessage).where(OutboxMessage.status == 'done', OutboxMessage.processed_at < cutoff))
+    db.session.commit()
+    click.echo(f"outbox: purged {result.rowcount} messages")
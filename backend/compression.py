@@ -0,0 +1,87 @@
+"""Response compression negotiated from Accept-Encoding: Brotli when installed, else gzip.
+
+JSON and text responses of at least COMPRESSION_MIN_BYTES are compressed as they leave the app,
+after the response cache, which keeps storing plain bodies that any encoding can be made from.
+Streamed responses are compressed chunk by chunk and flushed after each one, so clients still
+receive rows as they are fetched. A compressed response's ETag is made weak, since the bytes
+differ from the plain representation while the content is the same; conditional requests keep
+matching because If-None-Match compares weakly.
+"""
+import zlib
+
+from flask import request
+
+try:
+    import brotli  # optional: smaller than gzip at the same speed
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+COMPRESSIBLE = ('application/json', 'text/')
+
+
+class Encoder:
+    """Incremental compressor with the same interface for both encodings"""
+
+    def __init__(self, encoding, cfg):
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=cfg['COMPRESSION_BROTLI_QUALITY'])
+        else:
+            self._brotli = None
+            self._gzip = zlib.compressobj(cfg['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 31)  # 31: gzip framing
+
+    def chunk(self, data):
+        """Compress `data` and flush, so everything written so far can be decoded"""
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._gzip.compress(data) + self._gzip.flush()
+
+
+def compress_stream(chunks, encoder):
+    try:
+        for data in chunks:
+            if data:
+                yield encoder.chunk(data)
+        yield encoder.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def init_app(app):
+    """Compress responses on the way out; call right after metrics.init_app() so the time is measured"""
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_BYTES', 500)
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 5)
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    cfg = app.config
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(offered)
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = compress_stream(response.iter_encoded(), Encoder(encoding, cfg))
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < cfg['COMPRESSION_MIN_BYTES']:
+                return response
+            response.set_data(Encoder(encoding, cfg).finish(body))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -1,18 +1,111 @@
 import os
 from datetime import timedelta
 
+def env_flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///events.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///events.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Comma-separated read replicas for GET requests; a user's reads stay on the primary for
+    # REPLICA_STICKY_SECONDS after their own writes. The marks need CACHE_BACKEND=redis to reach
+    # every worker; REPLICA_STICKY_LOCAL keeps them in process instead (one worker, or testing).
+    SQLALCHEMY_REPLICA_URIS = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    REPLICA_STICKY_LOCAL = env_flag('REPLICA_STICKY_LOCAL', False)
+
+    # Connection pool (ignored for SQLite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_PRE_PING = env_flag('DB_POOL_PRE_PING', True)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    # SQLite connection pragmas
+    SQLITE_WAL = env_flag('SQLITE_WAL', True)
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
     SECRET_KEY = os.environ.get('SECRET_KEY', 'super-secret-key')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # Clients renew access tokens with the refresh token at POST /auth/refresh. The default stays at
+    # a day until the frontend does; lower JWT_ACCESS_TOKEN_MINUTES (e.g. 15) for clients that refresh
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 1440)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 30)))
+    # Each worker checks tokens against an in-memory copy of the revocations table, synced every
+    # REVOCATION_SYNC_SECONDS; expired revocations are purged every REVOCATION_PURGE_HOURS (0 = never)
+    REVOCATION_SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', 5))
+    REVOCATION_PURGE_HOURS = float(os.environ.get('REVOCATION_PURGE_HOURS', 24))
+    # Werkzeug hash method incl. work factor, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'.
+    # Changing it rehashes each user's password on their next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
+    # Seconds a worker trusts that a token's user still exists before re-checking (0 = every request)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+
+    # Prometheus metrics at /metrics, and a log of requests slower than this (0 disables it)
+    METRICS_ENABLED = env_flag('METRICS_ENABLED', True)
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+
+    # Response cache for public event reads: 'memory' (per worker), 'redis' (shared) or 'null'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 30))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+
+    # Token buckets per user (per client IP without a valid token), keyed by endpoint or blueprint. 'memory' limits each worker on its
+    # own; 'sqlite' shares the buckets between the workers on one host through RATELIMIT_SQLITE_PATH.
+    RATELIMIT_ENABLED = env_flag('RATELIMIT_ENABLED', True)
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'memory')
+    RATELIMIT_SQLITE_PATH = os.environ.get('RATELIMIT_SQLITE_PATH', '/tmp/eventhub-ratelimit.db')
+    RATELIMITS = {
+        'auth': '20/minute',  # login and signup hash passwords
+        'tickets.create_ticket': '30/minute',
+        'tickets': '120/minute',
+        'events': '1200/minute',
+    }
+    # Proxies in front of the app whose X-Forwarded-For is trusted for the client address
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+
+    # Background threads per worker running outbox messages (0: leave them to `flask outbox drain`),
+    # and the retry policy: exponential backoff from OUTBOX_BACKOFF_SECONDS, dead after OUTBOX_MAX_ATTEMPTS
+    OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 2))
+    OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 5))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+    OUTBOX_BACKOFF_SECONDS = float(os.environ.get('OUTBOX_BACKOFF_SECONDS', 2))
+    OUTBOX_BACKOFF_MAX_SECONDS = float(os.environ.get('OUTBOX_BACKOFF_MAX_SECONDS', 600))
+
+    # Events dated more than ARCHIVE_AFTER_DAYS ago move to the archive tables, by `flask data archive`
+    # or, every ARCHIVE_SCHEDULE_HOURS (0 = never), by the outbox workers
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_SCHEDULE_HOURS = float(os.environ.get('ARCHIVE_SCHEDULE_HOURS', 0))
+    ARCHIVE_MAX_BATCHES = int(os.environ.get('ARCHIVE_MAX_BATCHES', 20))
+
+    # Events with admission_queue set sell through an in-process queue: batches of up to ADMISSION_BATCH_SIZE
+    # purchases, collected for ADMISSION_BATCH_WAIT_MS, commit together; a full queue answers 503. Claims
+    # need CACHE_BACKEND=redis to be polled on any worker; ADMISSION_LOCAL_CLAIMS keeps them in process
+    # instead (one worker, or testing), otherwise events can't turn the queue on.
+    ADMISSION_BATCH_SIZE = int(os.environ.get('ADMISSION_BATCH_SIZE', 200))
+    ADMISSION_BATCH_WAIT_MS = float(os.environ.get('ADMISSION_BATCH_WAIT_MS', 5))
+    ADMISSION_QUEUE_MAX = int(os.environ.get('ADMISSION_QUEUE_MAX', 10000))
+    ADMISSION_CLAIM_TTL = int(os.environ.get('ADMISSION_CLAIM_TTL', 600))
+    ADMISSION_LOCAL_CLAIMS = env_flag('ADMISSION_LOCAL_CLAIMS', False)
+
+    # JSON and text responses of at least COMPRESSION_MIN_BYTES are sent with Brotli (if installed) or gzip,
+    # whichever the client's Accept-Encoding prefers
+    COMPRESSION_ENABLED = env_flag('COMPRESSION_ENABLED', True)
+    COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 500))
+
+    # Searches matching more events than this skip relevance ranking and return matches in id order
+    SEARCH_MAX_RANKED = int(os.environ.get('SEARCH_MAX_RANKED', 1000))
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    # Deployed behind Render's proxy; without this every anonymous client shares the proxy's rate limit bucket
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1))
 
 config = {
     'development': DevelopmentConfig,
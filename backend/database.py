@@ -0,0 +1,68 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+import replicas
+
+
+def normalize_database_url(url):
+    """Hosting providers still hand out `postgres://`, which SQLAlchemy 2 no longer accepts"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(cfg, url=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for `url` (default the primary); pool sizing only applies to server databases"""
+    options = {'pool_pre_ping': cfg['DB_POOL_PRE_PING']}
+    url = make_url(url or cfg['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite':
+        options.update(
+            pool_size=cfg['DB_POOL_SIZE'],
+            max_overflow=cfg['DB_MAX_OVERFLOW'],
+            pool_recycle=cfg['DB_POOL_RECYCLE'],
+        )
+    options.update(cfg.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def init_app(app):
+    """Fill in engine options before db.init_app() reads them"""
+    app.config.setdefault('DB_POOL_SIZE', 5)
+    app.config.setdefault('DB_MAX_OVERFLOW', 10)
+    app.config.setdefault('DB_POOL_PRE_PING', True)
+    app.config.setdefault('DB_POOL_RECYCLE', 1800)
+    app.config.setdefault('SQLITE_WAL', True)
+    app.config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    # Read replicas become binds 'replica0', 'replica1', ... (see replicas.py)
+    replica_uris = [normalize_database_url(u) for u in app.config.get('SQLALCHEMY_REPLICA_URIS') or ()]
+    app.config['SQLALCHEMY_REPLICA_URIS'] = replica_uris
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for key, uri in zip(replicas.bind_keys(app.config), replica_uris):
+        binds[key] = {'url': uri, **engine_options(app.config, uri)}
+
+
+def configure_engines(app):
+    """Apply the SQLite pragmas on every new connection; call after db.init_app()"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', sqlite_pragmas(app.config))
+
+
+def sqlite_pragmas(cfg):
+    statements = [f"PRAGMA busy_timeout = {int(cfg['SQLITE_BUSY_TIMEOUT_MS'])}"]
+    if cfg['SQLITE_WAL']:
+        # WAL lets readers run alongside the single writer instead of blocking on it
+        statements.append('PRAGMA journal_mode = WAL')
+    statements.append(f"PRAGMA synchronous = {cfg['SQLITE_SYNCHRONOUS']}")
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+    return on_connect
@@ -0,0 +1,90 @@
+# explain_queries.py
+"""Print the query plan of every route query and flag full table scans.
+
+Usage: python explain_queries.py  (exits non-zero if any route scans a table)
+
+Reads the plans from the DATABASE_URL database, which must be at the latest migration: the script
+never creates or changes tables itself.
+"""
+import os
+import sys
+from datetime import datetime
+
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import literal, select, text, union_all
+from sqlalchemy.orm import joinedload
+
+from app import create_app, db
+from models import Event, EventTombstone, Ticket
+from pagination import after_cursor
+
+app = create_app()
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def route_queries():
+    now = datetime.utcnow()
+    events = Event.row_query(include_creator=True)
+    page = [Event.date, Event.id]
+    my_tickets = Ticket.row_query(include_relations=True, include_user=False).filter(Ticket.user_id == 1)
+    return {
+        'events.get_events': events.order_by(*page).limit(51),
+        'events.get_events (cursor)': events.filter(after_cursor(page, [now, 1])).order_by(*page).limit(51),
+        'events.get_events (date range)': events.filter(Event.date >= now, Event.date <= now).order_by(*page).limit(51),
+        'events.get_events (location)': events.filter(Event.location == 'Nairobi').order_by(*page).limit(51),
+        'events.get_events (since)': db.session.query(union_all(
+            select(Event.id, Event.version, literal(False)).where(Event.version > 10),
+            select(EventTombstone.event_id, EventTombstone.version, literal(True)).where(EventTombstone.version > 10),
+        ).subquery()).limit(51),
+        'events.get_event': Event.query.options(joinedload(Event.creator)).filter(Event.id == 1),
+        'events by creator': Event.query.filter_by(creator_id=1),
+        'tickets.create_ticket (duplicate check)': Ticket.query.filter_by(user_id=1, event_id=1).limit(1),
+        'tickets.get_my_tickets': my_tickets.order_by(Ticket.id).limit(51),
+        'tickets.get_my_tickets (cursor, upcoming)': my_tickets.filter(Ticket.id > 100, Event.date >= now).order_by(Ticket.id).limit(51),
+        'tickets.get_my_tickets (status)': my_tickets.filter(Ticket.status == 'confirmed').order_by(Ticket.id).limit(51),
+        'tickets by event (delete cascade)': Ticket.query.filter_by(event_id=1),
+        'tickets by event and status': Ticket.query.filter_by(event_id=1, status='confirmed'),
+    }
+
+
+def explain(query):
+    """Return the plan lines for a query on the bound dialect"""
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + str(compiled))).all()
+    return [row[-1] for row in rows]
+
+
+def schema_is_current():
+    """True if the database is at the migrations' head; plans against any other schema would mislead"""
+    heads = set(ScriptDirectory(MIGRATIONS).get_heads())
+    with db.engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads()) == heads
+
+
+def is_full_scan(line):
+    line = line.strip()
+    if line.startswith('SCAN '):
+        return 'USING' not in line  # SQLite: "SCAN events" vs "SCAN events USING INDEX ..."
+    return line.startswith('Seq Scan')  # PostgreSQL
+
+
+with app.app_context():
+    if not schema_is_current():
+        sys.exit(f"{db.engine.url.render_as_string(hide_password=True)} is not at the latest migration; "
+                 "run `flask db upgrade` first")
+    failures = []
+    for name, query in route_queries().items():
+        plan = explain(query)
+        scans = [line for line in plan if is_full_scan(line)]
+        print(('❌ ' if scans else '✅ ') + name)
+        for line in plan:
+            print('     ' + line)
+        if scans:
+            failures.append(name)
+
+    if failures:
+        print(f"\n{len(failures)} route quer{'y' if len(failures) == 1 else 'ies'} fell back to a full scan")
+        sys.exit(1)
+    print("\nAll route queries use an index")
@@ -0,0 +1,17 @@
+class FieldsetError(ValueError):
+    """Raised when `fields` from the query string names something the endpoint doesn't return"""
+
+
+def parse_fields(raw, allowed, always=('id',)):
+    """Parse a sparse fieldset like `id,title,date` into names from `allowed`.
+
+    Returns None when `raw` is empty, meaning every field. `always` is added because the list
+    needs it, e.g. the columns its pages are ordered and keyed by.
+    """
+    if not raw:
+        return None
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise FieldsetError(f"Unknown fields: {', '.join(sorted(unknown))}; choose from {', '.join(allowed)}")
+    return [f for f in allowed if f in names or f in always]
@@ -0,0 +1,43 @@
+"""Gunicorn settings for production: `gunicorn -c gunicorn.conf.py wsgi:app`
+
+Every value can be overridden from the environment, e.g. WEB_CONCURRENCY=4 GUNICORN_THREADS=8.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# gthread keeps a pool of threads per worker, so requests waiting on the database, on password
+# hashing or on a slow client don't block the whole process. Set GUNICORN_WORKER_CLASS=gevent
+# (and `pip install gevent`) for many mostly idle connections, e.g. long streamed responses.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))  # gevent only
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+# GUNICORN_PRELOAD=true builds the app once in the master and forks workers from it: workers
+# share its memory pages and start (or restart) without re-importing anything. create_app()
+# opens no connections and starts no threads, so nothing needs undoing after the fork.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() in ('1', 'true', 'yes')
+
+
+def post_fork(server, worker):
+    # Belt and braces for preload: never share a pooled connection the master may have opened
+    wsgi = sys.modules.get('wsgi')
+    if wsgi is not None:
+        from models import db
+        with wsgi.app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
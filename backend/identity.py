@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+from cache import MemoryCache
+from models import db, User
+
+# What authenticated handlers need to know about the caller; the full row is loaded only when edited
+Identity = namedtuple('Identity', 'id username')
+
+
+def issue_token(user):
+    """Access token for `user` with the claims clients and handlers need embedded"""
+    return create_access_token(identity=user.id, additional_claims={'username': user.username})
+
+
+def issue_tokens(user):
+    """A short-lived access token plus the refresh token that renews it at POST /auth/refresh"""
+    return {'access_token': issue_token(user), 'refresh_token': create_refresh_token(identity=user.id)}
+
+
+def init_app(app, jwt):
+    """Resolve `flask_jwt_extended.current_user` to an Identity, memoised per worker for a short TTL.
+
+    flask_jwt_extended already caches the result for the rest of the request. The cross-request
+    cache only remembers that a user id still exists, so a deleted user is rejected (401) once
+    their entry expires; renames evict it right away through forget_user().
+    """
+    app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+    app.config.setdefault('IDENTITY_CACHE_MAX_ENTRIES', 4096)
+    ttl = app.config['IDENTITY_CACHE_TTL']
+    app.extensions['identity_cache'] = MemoryCache(app.config['IDENTITY_CACHE_MAX_ENTRIES'], ttl) if ttl else None
+
+    @jwt.user_lookup_loader
+    def load_identity(jwt_header, jwt_data):
+        return lookup_identity(jwt_data['sub'])
+
+
+def lookup_identity(user_id):
+    users = current_app.extensions['identity_cache']
+    key = f'users:{user_id}'
+    identity = users.get(key) if users else None
+    if identity is None:
+        row = db.session.execute(db.select(User.id, User.username).filter_by(id=user_id)).first()
+        if row is None:
+            return None
+        identity = Identity(*row)
+        if users:
+            users.set(key, identity)
+    return identity
+
+
+def forget_user(user_id):
+    """Evict a user from this worker's identity cache after it was renamed or deleted"""
+    users = current_app.extensions['identity_cache']
+    if users:
+        users.delete(f'users:{user_id}')
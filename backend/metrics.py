@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+logger = logging.getLogger('eventhub.slow_requests')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+MAX_LOGGED_STATEMENTS = 50
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                labels = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._series.items()):
+                labels = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+                lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+class Metrics:
+    """Per-worker request metrics; each gunicorn worker exposes its own /metrics"""
+
+    def __init__(self):
+        labels = ('endpoint', 'method')
+        self.requests = Counter('http_requests_total', 'Requests handled', ('endpoint', 'method', 'status'))
+        self.duration = Histogram('http_request_duration_seconds', 'Total handler time', labels, LATENCY_BUCKETS)
+        self.db_time = Histogram('db_query_duration_seconds', 'Time spent in SQL per request', labels, LATENCY_BUCKETS)
+        self.db_queries = Histogram('db_queries_per_request', 'SQL statements per request', labels, QUERY_COUNT_BUCKETS)
+        self.serialization = Histogram('json_serialization_seconds', 'Time spent encoding JSON per request',
+                                       labels, LATENCY_BUCKETS)
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.duration, self.db_time, self.db_queries, self.serialization):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+def init_app(app):
+    """Instrument requests, SQL and JSON encoding, and serve the results at /metrics"""
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    if not app.config['METRICS_ENABLED']:
+        return
+    metrics = app.extensions['metrics'] = Metrics()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    encode = app.json.dumps
+
+    def timed_dumps(obj, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return encode(obj, **kwargs)
+        start = time.perf_counter()
+        try:
+            return encode(obj, **kwargs)
+        finally:
+            stats['serialization'] += time.perf_counter() - start
+    app.json.dumps = timed_dumps
+
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = {'start': time.perf_counter(), 'queries': 0, 'db_time': 0.0,
+                            'serialization': 0.0, 'statements': []}
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = current_stats()
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - stats['start']
+        labels = (request.endpoint or 'unmatched', request.method)
+        metrics.requests.inc(labels + (str(response.status_code),))
+        metrics.duration.observe(labels, elapsed)
+        metrics.db_time.observe(labels, stats['db_time'])
+        metrics.db_queries.observe(labels, stats['queries'])
+        metrics.serialization.observe(labels, stats['serialization'])
+
+        threshold = app.config['SLOW_REQUEST_MS']
+        if threshold and elapsed * 1000 >= threshold:
+            logger.warning('Slow request %s %s: %.0fms, %d queries (%.0fms in DB), %.0fms serializing\n%s',
+                           request.method, request.full_path.rstrip('?'), elapsed * 1000, stats['queries'],
+                           stats['db_time'] * 1000, stats['serialization'] * 1000,
+                           '\n'.join(stats['statements']))
+        return response
+
+    @app.route('/metrics', methods=['GET'], endpoint='metrics')
+    def metrics_endpoint():
+        """Prometheus text exposition of this worker's request metrics"""
+        return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is None or not conn.info.get('query_start'):
+        return
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    stats['queries'] += 1
+    stats['db_time'] += elapsed
+    if len(stats['statements']) < MAX_LOGGED_STATEMENTS:
+        stats['statements'].append(f'  [{elapsed * 1000:.1f}ms] {" ".join(statement.split())}')
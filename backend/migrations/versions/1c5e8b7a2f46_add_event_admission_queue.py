@@ -0,0 +1,36 @@
+"""Add event admission queue
+
+Revision ID: 1c5e8b7a2f46
+Revises: f4a7c2d9e815
+Create Date: 2026-10-18 18:10:27.630174
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c5e8b7a2f46'
+down_revision = 'f4a7c2d9e815'
+branch_labels = None
+depends_on = None
+
+
+# SQLite rebuilds the table for these changes; keep the AUTOINCREMENT added in f4a7c2d9e815
+KEEP_AUTOINCREMENT = {'sqlite_autoincrement': True}
+
+
+def upgrade():
+    with op.batch_alter_table('events', schema=None, table_kwargs=KEEP_AUTOINCREMENT) as batch_op:
+        batch_op.add_column(sa.Column('admission_queue', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    with op.batch_alter_table('archived_events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('admission_queue', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('archived_events', schema=None) as batch_op:
+        batch_op.drop_column('admission_queue')
+
+    with op.batch_alter_table('events', schema=None, table_kwargs=KEEP_AUTOINCREMENT) as batch_op:
+        batch_op.drop_column('admission_queue')
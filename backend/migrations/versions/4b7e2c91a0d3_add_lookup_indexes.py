@@ -0,0 +1,36 @@
+"""Add lookup indexes
+
+Revision ID: 4b7e2c91a0d3
+Revises: dd635c18721f
+Create Date: 2026-10-18 09:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2c91a0d3'
+down_revision = 'dd635c18721f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.create_index('ix_events_date_id', ['date', 'id'], unique=False)
+        batch_op.create_index('ix_events_location_date', ['location', 'date'], unique=False)
+        batch_op.create_index('ix_events_creator_id', ['creator_id'], unique=False)
+
+    with op.batch_alter_table('tickets', schema=None) as batch_op:
+        batch_op.create_index('ix_tickets_event_id_status', ['event_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tickets', schema=None) as batch_op:
+        batch_op.drop_index('ix_tickets_event_id_status')
+
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_index('ix_events_creator_id')
+        batch_op.drop_index('ix_events_location_date')
+        batch_op.drop_index('ix_events_date_id')
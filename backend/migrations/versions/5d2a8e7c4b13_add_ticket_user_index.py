@@ -0,0 +1,26 @@
+"""Add ticket user index
+
+Revision ID: 5d2a8e7c4b13
+Revises: c81d4f02b6e9
+Create Date: 2026-10-18 12:05:47.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a8e7c4b13'
+down_revision = 'c81d4f02b6e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tickets', schema=None) as batch_op:
+        batch_op.create_index('ix_tickets_user_id_id', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tickets', schema=None) as batch_op:
+        batch_op.drop_index('ix_tickets_user_id_id')
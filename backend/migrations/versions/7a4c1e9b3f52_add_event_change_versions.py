@@ -0,0 +1,54 @@
+"""Add event change versions
+
+Revision ID: 7a4c1e9b3f52
+Revises: e3b9f6a1d820
+Create Date: 2026-10-18 14:02:36.815540
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4c1e9b3f52'
+down_revision = 'e3b9f6a1d820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_events_version_id', ['version', 'id'], unique=False)
+
+    op.create_table('event_catalogue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('event_tombstones',
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('event_id')
+    )
+    with op.batch_alter_table('event_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_event_tombstones_version_event_id', ['version', 'event_id'], unique=False)
+
+    # Existing events all count as changed in version 1
+    op.execute("UPDATE events SET updated_at = created_at, version = 1")
+    op.execute("INSERT INTO event_catalogue (id, version, updated_at) VALUES (1, 1, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    with op.batch_alter_table('event_tombstones', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_tombstones_version_event_id')
+
+    op.drop_table('event_tombstones')
+    op.drop_table('event_catalogue')
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_index('ix_events_version_id')
+        batch_op.drop_column('version')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,38 @@
+"""Add token revocations
+
+Revision ID: 9e2f5b8c4d17
+Revises: 1c5e8b7a2f46
+Create Date: 2026-10-18 19:02:41.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e2f5b8c4d17'
+down_revision = '1c5e8b7a2f46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_revocations',
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('token_type', sa.String(length=10), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('token_revocations', schema=None) as batch_op:
+        batch_op.create_index('ix_token_revocations_expires_at', ['expires_at'], unique=False)
+        batch_op.create_index('ix_token_revocations_revoked_at', ['revoked_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_revocations', schema=None) as batch_op:
+        batch_op.drop_index('ix_token_revocations_revoked_at')
+        batch_op.drop_index('ix_token_revocations_expires_at')
+
+    op.drop_table('token_revocations')
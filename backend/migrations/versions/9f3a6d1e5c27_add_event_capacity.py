@@ -0,0 +1,34 @@
+"""Add event capacity and sold counter
+
+Revision ID: 9f3a6d1e5c27
+Revises: 4b7e2c91a0d3
+Create Date: 2026-10-18 10:02:47.915362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3a6d1e5c27'
+down_revision = '4b7e2c91a0d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('tickets_sold', sa.Integer(), server_default='0', nullable=False))
+
+    # Existing events start with every live ticket already counted
+    op.execute(
+        "UPDATE events SET tickets_sold = "
+        "(SELECT COUNT(*) FROM tickets WHERE tickets.event_id = events.id AND tickets.status != 'canceled')"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_column('tickets_sold')
+        batch_op.drop_column('capacity')
@@ -0,0 +1,45 @@
+"""Add event sales aggregates
+
+Revision ID: c81d4f02b6e9
+Revises: 9f3a6d1e5c27
+Create Date: 2026-10-18 11:40:05.381924
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d4f02b6e9'
+down_revision = '9f3a6d1e5c27'
+branch_labels = None
+depends_on = None
+
+COUNTED = {'status': ('pending', 'confirmed', 'canceled'), 'payment_status': ('unpaid', 'free', 'paid', 'refunded')}
+
+
+def upgrade():
+    op.create_table('event_sales',
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('pending', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('confirmed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('canceled', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('unpaid', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('free', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('paid', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('refunded', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.PrimaryKeyConstraint('event_id')
+    )
+
+    # Backfill from existing tickets in one pass, then give ticketless events a zero row
+    columns = [value for values in COUNTED.values() for value in values]
+    sums = ', '.join(f"SUM(CASE WHEN {field} = '{value}' THEN 1 ELSE 0 END)"
+                     for field, values in COUNTED.items() for value in values)
+    op.execute(f"INSERT INTO event_sales (event_id, {', '.join(columns)}) "
+               f"SELECT event_id, {sums} FROM tickets GROUP BY event_id")
+    op.execute("INSERT INTO event_sales (event_id) SELECT id FROM events WHERE id NOT IN (SELECT event_id FROM event_sales)")
+
+
+def downgrade():
+    op.drop_table('event_sales')
@@ -0,0 +1,41 @@
+"""Add event search index
+
+Revision ID: e3b9f6a1d820
+Revises: 5d2a8e7c4b13
+Create Date: 2026-10-18 13:21:09.442871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b9f6a1d820'
+down_revision = '5d2a8e7c4b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE events_fts USING fts5("
+                   "title, description, location, tokenize='unicode61 remove_diacritics 2')")
+        op.execute("INSERT INTO events_fts (rowid, title, description, location) "
+                   "SELECT id, title, description, location FROM events")
+        return
+    # Filled by `flask data reindex-search`, which tokenizes with the same rules as the routes
+    op.create_table('event_terms',
+    sa.Column('term', sa.String(length=64), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('term', 'event_id')
+    )
+    op.create_index('ix_event_terms_event_id', 'event_terms', ['event_id'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE events_fts")
+        return
+    op.drop_index('ix_event_terms_event_id', table_name='event_terms')
+    op.drop_table('event_terms')
@@ -0,0 +1,79 @@
+"""Add event archive
+
+Revision ID: f4a7c2d9e815
+Revises: b6d1f3a9c204
+Create Date: 2026-10-18 17:21:48.115032
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a7c2d9e815'
+down_revision = 'b6d1f3a9c204'
+branch_labels = None
+depends_on = None
+
+
+def set_sqlite_autoincrement(enabled):
+    # Archived rows keep their ids, so SQLite must never hand them out again (server databases'
+    # sequences never do). Switching AUTOINCREMENT on means rebuilding the tables.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ('events', 'tickets'):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': enabled}):
+            pass
+
+
+def upgrade():
+    op.create_table('archived_events',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('location', sa.String(length=200), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('creator_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('capacity', sa.Integer(), nullable=True),
+    sa.Column('tickets_sold', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_events', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_events_creator_id', ['creator_id'], unique=False)
+        batch_op.create_index('ix_archived_events_date_id', ['date', 'id'], unique=False)
+
+    op.create_table('archived_tickets',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payment_status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_tickets', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_tickets_event_id', ['event_id'], unique=False)
+        batch_op.create_index('ix_archived_tickets_user_id_id', ['user_id', 'id'], unique=False)
+
+    set_sqlite_autoincrement(True)
+
+
+def downgrade():
+    set_sqlite_autoincrement(False)
+
+    with op.batch_alter_table('archived_tickets', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_tickets_user_id_id')
+        batch_op.drop_index('ix_archived_tickets_event_id')
+
+    op.drop_table('archived_tickets')
+    with op.batch_alter_table('archived_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_events_date_id')
+        batch_op.drop_index('ix_archived_events_creator_id')
+
+    op.drop_table('archived_events')
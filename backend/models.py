@@ -1,8 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import get_hasher
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,10 +17,13 @@ class User(db.Model):
     tickets = db.relationship('Ticket', backref='user', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = get_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return get_hasher().verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return get_hasher().needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {'id': self.id, 'username': self.username, 'email': self.email, 'created_at': self.created_at.isoformat()}
@@ -34,8 +38,24 @@ class Event(db.Model):
     price = db.Column(db.Float, nullable=False, default=0.0)
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    capacity = db.Column(db.Integer, nullable=True)  # None means unlimited
+    tickets_sold = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Catalogue version of the last change to a list-row field (FIELDS, so not tickets_sold); see catalogue.py
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Purchases are queued and committed in batches (see admission.py), for events expected to sell out fast
+    admission_queue = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     tickets = db.relationship('Ticket', backref='event', lazy=True, cascade='all, delete-orphan')
+    sales = db.relationship('EventSales', uselist=False, lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_events_date_id', 'date', 'id'),
+        db.Index('ix_events_location_date', 'location', 'date'),
+        db.Index('ix_events_creator_id', 'creator_id'),
+        db.Index('ix_events_version_id', 'version', 'id'),
+        {'sqlite_autoincrement': True},  # ids are never reused, so archived ones stay unique
+    )
 
     def to_dict(self, include_creator=False):
         data = {
@@ -46,12 +66,44 @@ class Event(db.Model):
             'location': self.location,
             'price': self.price,
             'creator_id': self.creator_id,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'capacity': self.capacity,
+            'tickets_sold': self.tickets_sold,
+            'version': self.version,
+            'admission_queue': self.admission_queue
         }
         if include_creator and self.creator:
             data['creator'] = {'id': self.creator.id, 'username': self.creator.username}
         return data
 
+    # Columns of the list, search and change-feed rows. tickets_sold is left out: seats are taken
+    # without a new catalogue version, so those (version-cached) rows would show it stale. The seat
+    # UPDATEs keep updated_at as it is for the same reason.
+    FIELDS = ('id', 'title', 'description', 'date', 'location', 'price', 'creator_id', 'created_at', 'updated_at', 'capacity', 'version', 'admission_queue')
+
+    @classmethod
+    def row_query(cls, include_creator=False, fields=None):
+        """Select just the columns behind to_dict(), for lists that don't need ORM instances;
+        `fields` narrows them to those of FIELDS (the creator still needs creator_id)"""
+        fields = fields or cls.FIELDS
+        if include_creator and 'creator_id' not in fields:
+            fields = [*fields, 'creator_id']
+        columns = [getattr(cls, f) for f in fields]
+        if not include_creator:
+            return db.session.query(*columns)
+        return db.session.query(*columns, User.username.label('creator_username')).outerjoin(User, User.id == cls.creator_id)
+
+    @staticmethod
+    def row_to_dict(row):
+        """to_dict() for a row_query() row; datetimes are left for the JSON provider to encode"""
+        data = row._asdict()
+        if 'creator_username' in data:
+            username = data.pop('creator_username')
+            if username is not None:
+                data['creator'] = {'id': data['creator_id'], 'username': username}
+        return data
+
 class Ticket(db.Model):
     __tablename__ = 'tickets'
     id = db.Column(db.Integer, primary_key=True)
@@ -62,7 +114,13 @@ class Ticket(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'event_id', name='unique_user_event'),)
+    # ix_tickets_user_id_id lets GET /tickets/my walk one user's tickets in id order without sorting
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'event_id', name='unique_user_event'),
+        db.Index('ix_tickets_event_id_status', 'event_id', 'status'),
+        db.Index('ix_tickets_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
 
     def to_dict(self, include_relations=False):
         data = {
@@ -81,4 +139,167 @@ class Ticket(db.Model):
                 data['event'] = {'id': self.event.id, 'title': self.event.title, 'date': self.event.date.isoformat(), 'location': self.event.location, 'price': self.event.price}
         return data
 
+    EVENT_FIELDS = ('title', 'date', 'location', 'price')
+    event_model = Event  # where the nested event columns come from
+
+    FIELDS = ('id', 'user_id', 'event_id', 'status', 'payment_status', 'created_at', 'updated_at')
+
+    @classmethod
+    def row_query(cls, include_relations=False, include_user=True, fields=None):
+        """Select just the columns behind to_dict(), joining the user and event columns it nests.
+
+        include_user=False leaves out the nested user, e.g. when every row belongs to the caller.
+        `fields` narrows the ticket's own columns to those of FIELDS.
+        """
+        fields = fields or cls.FIELDS
+        if include_relations:
+            fields = [*fields, *[f for f in ('user_id', 'event_id') if f not in fields]]
+        columns = [getattr(cls, f) for f in fields]
+        if not include_relations:
+            return db.session.query(*columns)
+        event = cls.event_model
+        related = [getattr(event, f).label(f'event_{f}') for f in cls.EVENT_FIELDS]
+        if not include_user:
+            return db.session.query(*columns, *related).outerjoin(event, event.id == cls.event_id)
+        return (db.session.query(*columns, User.username.label('user_username'), *related)
+                .outerjoin(User, User.id == cls.user_id)
+                .outerjoin(event, event.id == cls.event_id))
+
+    @classmethod
+    def row_to_dict(cls, row):
+        """to_dict() for a row_query() row; datetimes are left for the JSON provider to encode"""
+        data = row._asdict()
+        if 'user_username' in data:
+            username = data.pop('user_username')
+            if username is not None:
+                data['user'] = {'id': data['user_id'], 'username': username}
+        if 'event_title' in data:
+            event = {f: data.pop(f'event_{f}') for f in cls.EVENT_FIELDS}
+            if event['title'] is not None:
+                data['event'] = {'id': data['event_id'], **event}
+        return data
+
+class ArchivedEvent(db.Model):
+    """A past event moved out of `events` by archive.py: the same columns, plus when it moved"""
+    __tablename__ = 'archived_events'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    date = db.Column(db.DateTime, nullable=False)
+    location = db.Column(db.String(200), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    creator_id = db.Column(db.Integer, nullable=False)  # no foreign key, like the other archive columns
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    capacity = db.Column(db.Integer, nullable=True)
+    tickets_sold = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    admission_queue = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_archived_events_date_id', 'date', 'id'),
+        db.Index('ix_archived_events_creator_id', 'creator_id'),
+    )
+
+    FIELDS = Event.FIELDS
+
+    @classmethod
+    def row_query(cls, include_creator=False, fields=None):
+        return Event.row_query.__func__(cls, include_creator, fields)
+
+    row_to_dict = staticmethod(Event.row_to_dict)
+
+class ArchivedTicket(db.Model):
+    """A ticket of an archived event, as it was when the event was archived"""
+    __tablename__ = 'archived_tickets'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    event_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    payment_status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    FIELDS = Ticket.FIELDS
+    EVENT_FIELDS = Ticket.EVENT_FIELDS
+    event_model = ArchivedEvent
+
+    __table_args__ = (
+        db.Index('ix_archived_tickets_user_id_id', 'user_id', 'id'),
+        db.Index('ix_archived_tickets_event_id', 'event_id'),
+    )
+
+    @classmethod
+    def row_query(cls, include_relations=False, include_user=True, fields=None):
+        return Ticket.row_query.__func__(cls, include_relations, include_user, fields)
+
+    @classmethod
+    def row_to_dict(cls, row):
+        return Ticket.row_to_dict.__func__(cls, row)
+
+class EventSales(db.Model):
+    """Ticket counts per status and payment status, kept in step by the ticket routes (see sales.py)"""
+    __tablename__ = 'event_sales'
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), primary_key=True)
+    pending = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    confirmed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    canceled = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unpaid = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    free = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    paid = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    refunded = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    COUNTED = {'status': ('pending', 'confirmed', 'canceled'), 'payment_status': ('unpaid', 'free', 'paid', 'refunded')}
+
+class EventCatalogue(db.Model):
+    """The single row holding the event catalogue's change version (see catalogue.py)"""
+    __tablename__ = 'event_catalogue'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class EventTombstone(db.Model):
+    """Marks a deleted event so `GET /events?since=` can report the delete"""
+    __tablename__ = 'event_tombstones'
+    event_id = db.Column(db.Integer, primary_key=True)  # no foreign key: the event row is gone
+    version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_event_tombstones_version_event_id', 'version', 'event_id'),)
+
+class OutboxMessage(db.Model):
+    """Work to run after a commit, written in the same transaction as the change (see outbox.py)"""
+    __tablename__ = 'outbox_messages'
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # One message per side effect: enqueueing the same key again is a no-op
+    idempotency_key = db.Column(db.String(200), nullable=False, unique=True)
+    status = db.Column(db.String(10), nullable=False, default='pending', server_default='pending')  # pending, done, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    lease_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    STATUSES = ('pending', 'done', 'dead')
+
+    __table_args__ = (db.Index('ix_outbox_messages_status_available_at', 'status', 'available_at'),)
+
+class TokenRevocation(db.Model):
+    """A JWT revoked before it expired, by its jti; mirrored in each worker's memory (see revocation.py)"""
+    __tablename__ = 'token_revocations'
+    jti = db.Column(db.String(36), primary_key=True)
+    token_type = db.Column(db.String(10), nullable=False)  # access or refresh
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # Workers sync by revoked_at; the purge deletes by expires_at
+    __table_args__ = (
+        db.Index('ix_token_revocations_revoked_at', 'revoked_at'),
+        db.Index('ix_token_revocations_expires_at', 'expires_at'),
+    )
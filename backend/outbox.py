@@ -0,0 +1,242 @@
+"""Transactional outbox: post-processing that runs after the request, without ever being lost.
+
+Routes call enqueue() inside the transaction that changes a ticket, so a message exists exactly
+when the change committed. A small pool of threads in each worker then claims due messages,
+runs the handler registered for their topic and records the outcome. A failing handler is
+retried with exponential backoff and parked as 'dead' after OUTBOX_MAX_ATTEMPTS.
+
+Delivery is at least once: a worker that dies mid-handler leaves its claim to expire and the
+message runs again. Handlers receive the message's idempotency key so that side effects outside
+the database (a payment refund, an email) can be deduplicated by the service that performs them.
+"""
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, OutboxMessage
+
+logger = logging.getLogger('eventhub.outbox')
+
+handlers = {}
+
+
+def handler(topic):
+    """Register `fn(payload, key)` to process messages of `topic`; it must be safe to run twice"""
+    def register(fn):
+        handlers[topic] = fn
+        return fn
+    return register
+
+
+def enqueue(topic, payload, key, session=None):
+    enqueue_many([(topic, payload, key)], session)
+
+
+def enqueue_many(messages, session=None):
+    """Add (topic, payload, idempotency key) messages to the current transaction; known keys are skipped"""
+    if not messages:
+        return
+    session = session or db.session
+    now = datetime.utcnow()
+    rows = [{'topic': topic, 'payload': payload, 'idempotency_key': key, 'status': 'pending', 'attempts': 0,
+             'available_at': now, 'created_at': now} for topic, payload, key in messages]
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dml = sqlite if dialect == 'sqlite' else postgresql
+        statement = dml.insert(OutboxMessage).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    else:
+        known = set(session.scalars(select(OutboxMessage.idempotency_key)
+                                    .where(OutboxMessage.idempotency_key.in_([r['idempotency_key'] for r in rows]))))
+        rows = [r for r in rows if r['idempotency_key'] not in known]
+        statement = insert(OutboxMessage)
+    if rows:
+        session.execute(statement, rows)
+    g.outbox_enqueued = True
+
+
+def backoff(attempts, cfg):
+    """Seconds to wait before retry number `attempts`: doubling from the base, capped, with jitter"""
+    delay = min(cfg['OUTBOX_BACKOFF_SECONDS'] * 2 ** (attempts - 1), cfg['OUTBOX_BACKOFF_MAX_SECONDS'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(limit, lease_seconds, include_delayed=False):
+    """Lease up to `limit` due messages to this caller and commit; returns them in id order.
+
+    The lease is taken with a conditional UPDATE, so concurrent workers (threads, processes or a
+    drain command) never run the same message at once; an expired lease can be taken over.
+    """
+    now = datetime.utcnow()
+    unleased = or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now)
+    due = [OutboxMessage.status == 'pending', unleased]
+    if not include_delayed:
+        due.append(OutboxMessage.available_at <= now)
+    ids = db.session.scalars(select(OutboxMessage.id).where(*due).order_by(OutboxMessage.id).limit(limit)).all()
+    if not ids:
+        db.session.rollback()
+        return []
+    token = uuid.uuid4().hex
+    db.session.execute(update(OutboxMessage).where(OutboxMessage.id.in_(ids), *due)
+                       .values(lease_token=token, locked_until=now + timedelta(seconds=lease_seconds),
+                               attempts=OutboxMessage.attempts + 1)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+    return db.session.execute(select(OutboxMessage.id, OutboxMessage.topic, OutboxMessage.payload,
+                                     OutboxMessage.idempotency_key, OutboxMessage.attempts)
+                              .where(OutboxMessage.lease_token == token).order_by(OutboxMessage.id)).all()
+
+
+def process(message):
+    """Run one claimed message's handler outside any transaction and record the outcome; True if it succeeded"""
+    cfg = current_app.config
+    db.session.rollback()  # don't hold the claim's read transaction open while the handler runs
+    try:
+        fn = handlers.get(message.topic)
+        if fn is None:
+            raise LookupError(f'No outbox handler for {message.topic!r}')
+        fn(message.payload, message.idempotency_key)
+    except Exception as error:
+        db.session.rollback()
+        now = datetime.utcnow()
+        dead = message.attempts >= cfg['OUTBOX_MAX_ATTEMPTS']
+        values = {'last_error': f'{type(error).__name__}: {error}'[:2000], 'lease_token': None, 'locked_until': None}
+        if dead:
+            values.update(status='dead', processed_at=now)
+            logger.error('Outbox message %s (%s) failed %s times, giving up', message.id, message.topic,
+                         message.attempts, exc_info=True)
+        else:
+            values['available_at'] = now + timedelta(seconds=backoff(message.attempts, cfg))
+            logger.warning('Outbox message %s (%s) failed on attempt %s: %s', message.id, message.topic,
+                           message.attempts, error)
+        finish(message, values)
+        return False
+    finish(message, {'status': 'done', 'processed_at': datetime.utcnow(), 'last_error': None,
+                     'lease_token': None, 'locked_until': None})
+    return True
+
+
+def finish(message, values):
+    db.session.execute(update(OutboxMessage).where(OutboxMessage.id == message.id).values(**values)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def run_batch(include_delayed=False):
+    """Claim and process one batch; returns (succeeded, failed)"""
+    cfg = current_app.config
+    succeeded = failed = 0
+    for message in claim(cfg['OUTBOX_BATCH_SIZE'], cfg['OUTBOX_LEASE_SECONDS'], include_delayed):
+        if process(message):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def drain(include_delayed=False):
+    """Process due messages until none are left; with `include_delayed`, retries waiting on backoff
+    run right away too (once each, so a handler that keeps failing can't loop forever)"""
+    succeeded = failed = 0
+    while True:
+        batch = run_batch(include_delayed)
+        if batch == (0, 0):
+            return succeeded, failed
+        succeeded, failed = succeeded + batch[0], failed + batch[1]
+        include_delayed = False
+
+
+def counts():
+    rows = db.session.execute(select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status))
+    return {**dict.fromkeys(OutboxMessage.STATUSES, 0), **dict(rows.all())}
+
+
+class WorkerPool:
+    """Threads that process the outbox in the background of one worker process.
+
+    They start on the first request rather than in create_app(), so a preloaded gunicorn master
+    never forks with threads running; each forked worker starts its own pool. A request that
+    enqueued something wakes them as it finishes; otherwise they poll every OUTBOX_POLL_SECONDS
+    for retries and for messages left behind by other processes.
+
+    every() turns the pool into a scheduler as well: the job's message is keyed by its period,
+    so however many workers run the pool, each period is enqueued, and runs, once.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.size = app.config['OUTBOX_WORKERS']
+        self.poll_seconds = app.config['OUTBOX_POLL_SECONDS']
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._schedules = []
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.size):
+                threading.Thread(target=self._run, name=f'outbox-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def wake(self):
+        self._wake.set()
+
+    def every(self, seconds, topic, payload=None):
+        """Enqueue a `topic` message once every `seconds`, counted from the epoch"""
+        self._schedules.append({'seconds': seconds, 'topic': topic, 'payload': payload or {}, 'last': None})
+
+    def _enqueue_scheduled(self):
+        now = time.time()
+        for job in self._schedules:
+            period = int(now // job['seconds'])
+            if period != job['last']:
+                enqueue(job['topic'], job['payload'], f"{job['topic']}:{period}")
+                db.session.commit()
+                job['last'] = period
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self._enqueue_scheduled()
+                    busy = run_batch() != (0, 0)
+            except Exception:
+                logger.exception('Outbox worker failed, retrying after the poll interval')
+                busy = False
+            if not busy:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+
+def init_app(app):
+    app.config.setdefault('OUTBOX_WORKERS', 2)
+    app.config.setdefault('OUTBOX_POLL_SECONDS', 5)
+    app.config.setdefault('OUTBOX_BATCH_SIZE', 20)
+    app.config.setdefault('OUTBOX_LEASE_SECONDS', 60)
+    app.config.setdefault('OUTBOX_MAX_ATTEMPTS', 8)
+    app.config.setdefault('OUTBOX_BACKOFF_SECONDS', 2)
+    app.config.setdefault('OUTBOX_BACKOFF_MAX_SECONDS', 600)
+    if not app.config['OUTBOX_WORKERS']:
+        return  # messages wait for `flask outbox drain` or another process's pool
+    pool = app.extensions['outbox'] = WorkerPool(app)
+
+    @app.before_request
+    def start_outbox_workers():
+        pool.ensure_started()
+
+    @app.after_request
+    def wake_outbox_workers(response):
+        if g.pop('outbox_enqueued', False):
+            pool.wake()
+        return response
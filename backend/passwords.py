@@ -0,0 +1,65 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already queued; the caller should retry later"""
+
+
+@lru_cache(maxsize=None)
+def canonical_method(method):
+    """Expand a short method such as 'scrypt' to the full prefix werkzeug stores, e.g. 'scrypt:32768:8:1'"""
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Runs password hashing on a small per-worker thread pool with a bounded backlog.
+
+    hashlib releases the GIL while hashing, so request threads serving event reads keep running.
+    Once `max_pending` hashes are in flight further calls fail fast with HasherBusy instead of
+    queueing behind a burst of logins.
+    """
+
+    def __init__(self, method, salt_length=16, workers=2, max_pending=16):
+        self.method = method
+        self.salt_length = salt_length
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._pool.submit(fn, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method, salt_length=self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != canonical_method(self.method)
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+    app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 16)
+    app.extensions['password_hasher'] = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        salt_length=app.config['PASSWORD_SALT_LENGTH'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+    )
+
+
+def get_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,179 @@
+"""Per-client rate limits for each blueprint or endpoint, answered with 429 and Retry-After.
+
+Limits are token buckets kept in their GCRA form: instead of a token count and a refill time,
+each (scope, client) key stores a single "theoretical arrival time" (TAT). A request is allowed
+when it would push the TAT no further than one full bucket ahead of now. That is the same
+admission rule as a bucket of `count` tokens refilled at `count / period`, but it makes every
+check one read and one write of a float, which is O(1) in memory and one statement in SQL.
+
+A request with a valid token is counted against its user, wherever it comes from; others, and
+requests whose token fails to verify, against the client address.
+"""
+import logging
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+
+logger = logging.getLogger('eventhub.ratelimit')
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+RATE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$')
+EXEMPT_ENDPOINTS = {'metrics', 'health_check', 'static'}
+
+Limit = namedtuple('Limit', 'scope count period')
+
+
+def parse_rate(spec):
+    """'10/minute' or '100/5 minutes' -> (count, period in seconds)"""
+    match = RATE.match(spec)
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(f'Invalid rate limit {spec!r}, expected e.g. "10/minute"')
+    return int(match.group(1)), int(match.group(2) or 1) * PERIODS[match.group(3)]
+
+
+def client_key():
+    """'user:<id>' for a request with a valid access or refresh token, else 'ip:<address>'"""
+    try:
+        verify_jwt_in_request(optional=True, verify_type=False)
+        user_id = get_jwt().get('sub')
+    except (JWTExtendedException, PyJWTError):
+        user_id = None  # the view answers for the bad token; count it against the address
+    return f'ip:{request.remote_addr}' if user_id is None else f'user:{user_id}'
+
+
+class MemoryLimiter:
+    """Buckets for this worker only; the least recently seen keys are dropped past `max_keys`"""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tat = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, count, period):
+        """Take one token from `key`; returns 0 if allowed, else the seconds until it would be"""
+        interval = period / count
+        now = self.clock()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now) + interval
+            wait = tat - now - period
+            if wait > 0:
+                return wait
+            self._tat[key] = tat
+            self._tat.move_to_end(key)
+            if len(self._tat) > self.max_keys:
+                self._tat.popitem(last=False)
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._tat.clear()
+
+
+class SQLiteLimiter:
+    """Buckets shared by every worker on the host through a small SQLite file.
+
+    A stand-in for a Redis-style shared store when one process per core should still enforce a
+    single limit. Each check is one UPSERT; its WHERE clause applies the same rule as
+    MemoryLimiter, so a denied request writes nothing.
+    """
+
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID'
+    UPSERT = ('INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval) '
+              'ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval '
+              'WHERE max(tat, :now) + :interval - :now <= :period '
+              'RETURNING tat')
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = OFF')  # losing buckets in a crash only resets them
+            connection.execute(self.SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key, count, period):
+        interval = period / count
+        now = self.clock()
+        connection = self._connection()
+        params = {'key': key, 'now': now, 'interval': interval, 'period': period}
+        if connection.execute(self.UPSERT, params).fetchone() is not None:
+            return 0
+        row = connection.execute('SELECT tat FROM rate_limits WHERE key = ?', (key,)).fetchone()
+        return max(row[0] + interval - now - period, 0.001) if row else 0
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_limits')
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATELIMIT_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'eventhub-ratelimit.db'))
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('RATELIMITS', {})
+        if not app.config['RATELIMIT_ENABLED']:
+            return
+        backend = app.extensions['ratelimit'] = self._make_backend(app.config)
+        limits = {scope: Limit(scope, *parse_rate(spec)) for scope, spec in app.config['RATELIMITS'].items()}
+
+        @app.before_request
+        def check_rate_limit():
+            return self.check(backend, limits)
+
+    @staticmethod
+    def _make_backend(cfg):
+        kind = cfg['RATELIMIT_BACKEND']
+        if kind == 'memory':
+            return MemoryLimiter(cfg['RATELIMIT_MAX_KEYS'])
+        if kind == 'sqlite':
+            return SQLiteLimiter(cfg['RATELIMIT_SQLITE_PATH'])
+        raise ValueError(f'Unknown RATELIMIT_BACKEND {kind!r}')
+
+    @staticmethod
+    def check(backend, limits):
+        """Spend one token of the request's bucket, or answer 429 if it is empty.
+
+        An endpoint's own limit ('tickets.create_ticket') wins over its blueprint's ('tickets').
+        """
+        if request.method == 'OPTIONS' or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        limit = limits.get(request.endpoint) or limits.get(request.blueprint)
+        if limit is None:
+            return None
+        try:
+            wait = backend.hit(f'{limit.scope}:{client_key()}', limit.count, limit.period)
+        except sqlite3.Error:
+            logger.exception('Rate limit backend failed; letting the request through')
+            return None
+        if not wait:
+            return None
+        response = jsonify({'error': 'Too many requests, please retry later'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(math.ceil(wait))
+        return response
+
+
+limiter = RateLimiter()
@@ -0,0 +1,98 @@
+"""Read replicas: GET requests read from a replica bind, everything else uses the primary.
+
+Each URL in SQLALCHEMY_REPLICA_URIS becomes a Flask-SQLAlchemy bind ('replica0', 'replica1', ...)
+and a GET or HEAD request picks one of them for all of its reads. Writes never leave the primary:
+flushes and INSERT/UPDATE/DELETE statements are always bound to it, and requests with other
+methods (so every ticket transaction) don't touch a replica at all.
+
+Replicas lag, so a user reads from the primary for REPLICA_STICKY_SECONDS after one of their
+own successful writes, and while their token is that new (they just signed up or logged in,
+and the replica may not have their row yet). The marks have a store of their own, never the
+evictable response cache: Redis under its own prefix, so every worker sees them. Replicas are
+refused without CACHE_BACKEND=redis, unless REPLICA_STICKY_LOCAL keeps the marks in this process
+(a single worker, or local testing), where they stay until they expire.
+"""
+import random
+import sqlite3
+import time
+
+from flask import request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_sqlalchemy.session import Session
+from jwt import PyJWTError
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+from cache import RedisCache, make_store
+
+READ_METHODS = ('GET', 'HEAD')
+STICKY = ('primary', b'')  # stored as a (etag, body) pair, the shape every cache backend accepts
+
+
+def bind_keys(cfg):
+    return [f'replica{i}' for i in range(len(cfg.get('SQLALCHEMY_REPLICA_URIS') or ()))]
+
+
+class RoutingSession(Session):
+    """Session that reads through `info['replica']` when a request has set it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app):
+    """Route GET reads to the replicas; call after db.init_app() and cache.init_app()"""
+    app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+    app.config.setdefault('REPLICA_STICKY_LOCAL', False)
+    keys = bind_keys(app.config)
+    if not keys:
+        return
+    window = app.config['REPLICA_STICKY_SECONDS']
+    store = make_store(app, 'sticky', None, window)
+    if not isinstance(store, RedisCache) and not app.config['REPLICA_STICKY_LOCAL']:
+        raise RuntimeError('Read replicas need CACHE_BACKEND=redis so that every worker sees who just wrote; '
+                           'set REPLICA_STICKY_LOCAL=true to keep that per process (single worker only)')
+    app.extensions['replicas'] = keys
+    db = app.extensions['sqlalchemy']  # models imports this module for RoutingSession
+
+    @app.before_request
+    def route_reads_to_replica():
+        if request.method in READ_METHODS and not reads_own_writes(store, window):
+            db.session.info['replica'] = random.choice(keys)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            try:
+                user_id = get_jwt().get('sub')
+            except RuntimeError:  # the endpoint doesn't take a token
+                user_id = None
+            if user_id is not None:
+                store.set(f'primary:{user_id}', STICKY, ttl=window)
+        return response
+
+
+def reads_own_writes(store, window):
+    """Whether this request's user wrote recently enough that a replica may not show it yet"""
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return False  # the view decides what a bad token means; nothing to be consistent with
+    claims = get_jwt()
+    if not claims:
+        return False
+    return claims.get('iat', 0) > time.time() - window or store.get(f"primary:{claims['sub']}") is not None
+
+
+def sync_sqlite(primary_uri, replica_uri):
+    """Copy a SQLite primary onto a SQLite replica file; stands in for replication when testing locally"""
+    source, target = make_url(primary_uri).database, make_url(replica_uri).database
+    if not source or not target:
+        raise ValueError('Only file-backed SQLite databases can be synced')
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
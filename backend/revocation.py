@@ -0,0 +1,156 @@
+"""Revoked tokens, checked against each worker's in-memory copy of the revocations table.
+
+Logout and refresh-token rotation insert the token's jti into token_revocations. Each worker
+keeps the jtis of unexpired revocations in a dict (jti -> expiry), so the check on every
+authenticated request is a lookup in memory. The copy is loaded on first use. After that, at
+most every REVOCATION_SYNC_SECONDS, one indexed query on revoked_at fetches only the rows added
+since the previous sync. A revocation applies at once on the worker that made it, and on the
+others within REVOCATION_SYNC_SECONDS. Refresh-token rotation doesn't rely on the copy: its
+insert of the used token's jti fails if the row exists, so a refresh token works exactly once.
+
+Entries leave memory after their token expires. Expired rows are deleted by
+`flask data purge-revocations`, or every REVOCATION_PURGE_HOURS by the outbox workers. Both the
+dict and the table stay as small as the number of tokens revoked within one refresh-token lifetime.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, TokenRevocation
+import outbox
+
+# Each sync reads back this far past the newest row it has seen, to catch rows that committed
+# late or were stamped by a host whose clock runs behind
+SYNC_OVERLAP = timedelta(seconds=60)
+# Expired entries are dropped at most this often: the pass walks the whole copy, and until then
+# they only take memory, since their tokens fail verification anyway
+PRUNE_SECONDS = 300
+
+
+class Blocklist:
+    """This worker's copy of the unexpired revocations; `jti in blocklist` syncs when it is due"""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['REVOCATION_SYNC_SECONDS']
+        self._expires = {}
+        self._newest = None
+        self._loaded = False
+        self._next_sync = 0
+        self._next_prune = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return jti in self._expires
+
+    def __len__(self):
+        return len(self._expires)
+
+    def add(self, jti, expires_at):
+        self._expires[jti] = expires_at
+
+    def sync(self):
+        """Fetch revocations added since the last sync, and now and then forget expired ones"""
+        # Until the first load, every thread waits for it; afterwards a thread that finds another
+        # one syncing carries on with the copy as it is
+        if not self._lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            if self._loaded and time.monotonic() < self._next_sync:
+                return  # another thread synced while this one waited
+            now = datetime.utcnow()
+            query = select(TokenRevocation.jti, TokenRevocation.expires_at, TokenRevocation.revoked_at).where(
+                TokenRevocation.expires_at > now)
+            if self._newest is not None:
+                query = query.where(TokenRevocation.revoked_at >= self._newest - SYNC_OVERLAP)
+            # Straight from the primary, outside the request's session: a replica may not have the row yet
+            with db.engine.connect() as connection:
+                rows = connection.execute(query).all()
+            for jti, expires_at, revoked_at in rows:
+                self._expires[jti] = expires_at
+                self._newest = revoked_at if self._newest is None else max(self._newest, revoked_at)
+            if time.monotonic() >= self._next_prune:
+                for jti, expires_at in list(self._expires.items()):
+                    if expires_at <= now:
+                        self._expires.pop(jti, None)
+                self._next_prune = time.monotonic() + PRUNE_SECONDS
+            self._loaded = True
+            self._next_sync = time.monotonic() + self.interval
+        finally:
+            self._lock.release()
+
+
+def revocation_row(claims, now):
+    return {'jti': claims['jti'], 'token_type': claims['type'], 'user_id': int(claims['sub']),
+            'expires_at': datetime.utcfromtimestamp(claims['exp']), 'revoked_at': now}
+
+
+def revoke(*claims):
+    """Revoke the tokens with these decoded claims and commit; already revoked ones are skipped"""
+    now = datetime.utcnow()
+    rows = {c['jti']: revocation_row(c, now) for c in claims}
+    for attempt in range(2):
+        known = set(db.session.scalars(select(TokenRevocation.jti).where(TokenRevocation.jti.in_(list(rows)))))
+        new = [row for jti, row in rows.items() if jti not in known]
+        try:
+            if new:
+                db.session.execute(insert(TokenRevocation), new)
+            db.session.commit()
+            break
+        except IntegrityError:  # revoked concurrently, e.g. a double-clicked logout; skip it on the retry
+            db.session.rollback()
+            if attempt:
+                raise
+    blocklist = current_app.extensions['blocklist']
+    for row in rows.values():
+        blocklist.add(row['jti'], row['expires_at'])
+
+
+def rotate(claims):
+    """Revoke a refresh token that is being exchanged and commit; False if it was revoked already.
+
+    The primary key decides, not the copy in memory, which can be REVOCATION_SYNC_SECONDS behind:
+    of any requests presenting the same refresh token, on any worker, exactly one gets through.
+    """
+    row = revocation_row(claims, datetime.utcnow())
+    try:
+        db.session.execute(insert(TokenRevocation), [row])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    finally:
+        current_app.extensions['blocklist'].add(row['jti'], row['expires_at'])
+    return True
+
+
+def purge():
+    """Delete revocations of tokens that have expired anyway; returns how many"""
+    result = db.session.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
+
+
+@outbox.handler('revocations.purge')
+def scheduled_purge(payload, key):
+    purge()
+
+
+def init_app(app, jwt):
+    app.config.setdefault('REVOCATION_SYNC_SECONDS', 5)
+    app.config.setdefault('REVOCATION_PURGE_HOURS', 24)
+    blocklist = app.extensions['blocklist'] = Blocklist(app)
+
+    @jwt.token_in_blocklist_loader
+    def token_revoked(jwt_header, jwt_data):
+        return jwt_data['jti'] in blocklist
+
+    pool = app.extensions.get('outbox')
+    if app.config['REVOCATION_PURGE_HOURS'] and pool is not None:
+        pool.every(app.config['REVOCATION_PURGE_HOURS'] * 3600, 'revocations.purge')
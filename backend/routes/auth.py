@@ -1,9 +1,20 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token,jwt_required, get_jwt_identity
-from models import db, User
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, current_user, decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from models import db, User, Event
+import catalogue
+import revocation
+from identity import issue_token, issue_tokens, forget_user
+from passwords import HasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
+@auth_bp.errorhandler(HasherBusy)
+def hasher_busy(error):
+    """Shed login/signup bursts instead of tying up workers that serve event reads"""
+    return jsonify({'error': 'Too many login attempts in progress, please retry'}), 503, {'Retry-After': '1'}
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     data = request.get_json()
@@ -17,8 +28,7 @@ def signup():
     user.set_password(data['password'])
     db.session.add(user)
     db.session.commit()
-    access_token = create_access_token(identity=user.id)
-    return jsonify({'message': 'User created', 'access_token': access_token, 'user': user.to_dict()}), 201
+    return jsonify({'message': 'User created', **issue_tokens(user), 'user': user.to_dict()}), 201
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -28,10 +38,37 @@ def login():
     user = User.query.filter_by(email=data['email']).first()
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid credentials'}), 401
-    access_token = create_access_token(identity=user.id)
-    return jsonify({'message': 'Login successful', 'access_token': access_token, 'user': user.to_dict()}), 200
+    if user.password_needs_rehash():
+        # Upgrade hashes made with older PASSWORD_HASH_* settings while we have the plaintext
+        user.set_password(data['password'])
+        db.session.commit()
+    return jsonify({'message': 'Login successful', **issue_tokens(user), 'user': user.to_dict()}), 200
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """Trade a refresh token for a new access token and a new refresh token; the old one is revoked,
+    so a stolen refresh token stops working as soon as either party uses it"""
+    if not revocation.rotate(get_jwt()):
+        return jsonify({'error': 'Refresh token has already been used'}), 401
+    return jsonify({'message': 'Token refreshed', **issue_tokens(current_user)}), 200
 
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke the token in the Authorization header, and the `refresh_token` in the body if one is sent"""
+    claims = [get_jwt()]
+    refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+    if refresh_token:
+        try:
+            refresh_claims = decode_token(refresh_token)
+        except (JWTExtendedException, PyJWTError):
+            return jsonify({'error': 'Invalid refresh token'}), 400
+        if refresh_claims['type'] != 'refresh' or refresh_claims['sub'] != claims[0]['sub']:
+            return jsonify({'error': 'Invalid refresh token'}), 400
+        claims.append(refresh_claims)
+    revocation.revoke(*claims)
+    return jsonify({'message': 'Logged out'}), 200
 
 
 @auth_bp.route('/update-profile', methods=['PATCH'])
@@ -54,6 +91,9 @@ def update_profile():
 
     # Update username
     user.username = new_username
+    catalogue.touch(Event.creator_id == user.id)  # events embed the creator's username
     db.session.commit()
+    forget_user(user.id)
 
-    return jsonify({'message': 'Profile updated', 'user': user.to_dict()}), 200
+    # Reissue the token so its username claim matches the new name
+    return jsonify({'message': 'Profile updated', 'access_token': issue_token(user), 'user': user.to_dict()}), 200
@@ -1,29 +1,189 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, g, request, jsonify
+from flask_jwt_extended import jwt_required, current_user
 from datetime import datetime
-from models import db, User, Event
+from urllib.parse import urlencode
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import joinedload
+from models import db, ArchivedEvent, Event, EventSales, EventTombstone
+from pagination import PaginationError, parse_limit, keyset_page
+from fieldsets import FieldsetError, parse_fields
+from cache import cache
+from streaming import wants_stream, stream_json
+import catalogue
+import sales
+import search
 
 events_bp = Blueprint('events', __name__)
 
-def get_current_user():
-    return User.query.get(get_jwt_identity())
+def parse_date(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def parse_capacity(value):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError
+    return value
+
+def admission_queue_error(value):
+    """Why `value` can't be set as the event's admission_queue, or None"""
+    if not isinstance(value, bool):
+        return 'admission_queue must be a boolean'
+    if value and not current_app.extensions['admission'].shared:
+        return ('admission_queue needs CACHE_BACKEND=redis so that any worker can answer for a claim; '
+                'set ADMISSION_LOCAL_CLAIMS=true to keep claims per process (single worker only)')
+    return None
+
+# List pages are keyed by the catalogue version, so any worker sees a change as soon as it commits
+def events_list_key():
+    return f"events:list:{g.catalogue_version}:{urlencode(sorted(request.args.items(multi=True)))}"
+
+def search_key():
+    return f"events:search:{g.catalogue_version}:{urlencode(sorted(request.args.items(multi=True)))}"
+
+# Detail pages are keyed by the event's version and seat count, read by primary key before the
+# view runs: a write committed on any worker changes the key everywhere, and an entry written
+# from a newer row than its key is never looked up again. Archived events no longer change.
+def event_key(event_id):
+    row = db.session.execute(select(Event.version, Event.tickets_sold).where(Event.id == event_id)).first()
+    if row is None:
+        return f'events:{event_id}:' + ('archived' if include_archived() else 'missing')
+    return f'events:{event_id}:{row.version}:{row.tickets_sold}'
+
+def include_archived():
+    """Whether the request asked for archived events and tickets too (see archive.py)"""
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+def with_archived(live, archived):
+    """Rows of both queries (which select the same columns) as one subquery, flagged `archived`"""
+    return union_all(live.add_columns(literal(False).label('archived')).statement,
+                     archived.add_columns(literal(True).label('archived')).statement).subquery('rows')
+
+LIST_FILTERS = ('date_from', 'date_to', 'max_price', 'location')
+LIST_FIELDS = Event.FIELDS + ('creator',)
+
+def list_rows(args, model=Event):
+    """`model.row_query()` narrowed to the `fields` in `args`; the creator is only joined when asked for.
+    id and date are always selected, as pages are keyed by them."""
+    fields = parse_fields(args.get('fields'), LIST_FIELDS, always=('id', 'date'))
+    if fields is None:
+        return model.row_query(include_creator=True)
+    return model.row_query(include_creator='creator' in fields, fields=[f for f in fields if f != 'creator'])
+
+def filtered_events_query(args, query=None, model=Event):
+    """Events (or `query`, which must select from `model`'s table) matching the list filters in `args`;
+    raises ValueError on a malformed value"""
+    if query is None:
+        query = list_rows(args, model)
+    if args.get('date_from'):
+        query = query.filter(model.date >= parse_date(args['date_from']))
+    if args.get('date_to'):
+        query = query.filter(model.date <= parse_date(args['date_to']))
+    if args.get('max_price'):
+        query = query.filter(model.price <= float(args['max_price']))
+    if args.get('location'):
+        query = query.filter(model.location == args['location'])
+    return query
+
+def parse_since(value):
+    since = int(value)
+    if since < 0:
+        raise ValueError
+    return since
+
+def event_changes(since, args):
+    """Events changed and ids deleted after catalogue version `since`, one page in version order"""
+    changes = union_all(
+        select(Event.id, Event.version, literal(False).label('deleted')).where(Event.version > since),
+        select(EventTombstone.event_id, EventTombstone.version, literal(True)).where(EventTombstone.version > since),
+    ).subquery('changes')
+    limit = parse_limit(args.get('limit'))
+    page, next_cursor = keyset_page(db.session.query(changes), [changes.c.version, changes.c.id],
+                                    args.get('cursor'), limit, [int, int])
+    live = [c.id for c in page if not c.deleted]
+    rows = {r.id: r for r in list_rows(args).filter(Event.id.in_(live))} if live else {}
+    return {
+        'events': [Event.row_to_dict(rows[i]) for i in live if i in rows],
+        'deleted': [c.id for c in page if c.deleted],
+        'next_cursor': next_cursor,
+        'version': g.catalogue_version,
+    }
 
 @events_bp.route('/', methods=['GET'])
+@catalogue.conditional
+@cache.cached_json(events_list_key)
 def get_events():
-    events = Event.query.all()
-    return jsonify({'events': [e.to_dict(include_creator=True) for e in events]}), 200
+    args = request.args
+    if 'since' in args:
+        if wants_stream() or any(args.get(f) for f in LIST_FILTERS):
+            return jsonify({'error': 'since cannot be combined with filters or stream'}), 400
+        try:
+            return jsonify(event_changes(parse_since(args['since']), args)), 200
+        except (PaginationError, FieldsetError) as e:
+            return jsonify({'error': str(e)}), 400
+        except ValueError:
+            return jsonify({'error': 'since must be a non-negative integer'}), 400
+    try:
+        query = filtered_events_query(args)
+        order = [Event.date, Event.id]
+        if include_archived():
+            rows = with_archived(query, filtered_events_query(args, model=ArchivedEvent))
+            query, order = db.session.query(rows), [rows.c.date, rows.c.id]
+    except FieldsetError as e:
+        return jsonify({'error': str(e)}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid filter value'}), 400
+    if wants_stream():
+        return stream_json('events', query.order_by(*order), Event.row_to_dict)
+    try:
+        limit = parse_limit(args.get('limit'))
+        events, next_cursor = keyset_page(query, order, args.get('cursor'), limit, [datetime, int])
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'events': [Event.row_to_dict(e) for e in events], 'next_cursor': next_cursor}), 200
+
+@events_bp.route('/search', methods=['GET'])
+@catalogue.conditional
+@cache.cached_json(search_key)
+def search_events():
+    """Events matching every word of `q`, best match first; accepts the list filters too"""
+    args = request.args
+    try:
+        matches = search.matches(args.get('q', ''), current_app.config['SEARCH_MAX_RANKED'])
+        rows = list_rows(args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Page through the (id, score) matches first and fetch full rows for that page only, so the
+    # sort never carries descriptions; events are joined in earlier only when a filter needs them
+    page = db.session.query(matches.c.id, matches.c.score)
+    try:
+        if any(args.get(f) for f in LIST_FILTERS):
+            page = filtered_events_query(args, page.join(Event, Event.id == matches.c.id))
+    except ValueError:
+        return jsonify({'error': 'Invalid filter value'}), 400
+    try:
+        limit = parse_limit(args.get('limit'))
+        hits, next_cursor = keyset_page(page, [matches.c.score, matches.c.id], args.get('cursor'), limit, [float, int])
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = {r.id: r for r in rows.filter(Event.id.in_([h.id for h in hits]))}
+    events = [Event.row_to_dict(rows[h.id]) for h in hits if h.id in rows]
+    return jsonify({'events': events, 'next_cursor': next_cursor}), 200
 
 @events_bp.route('/<int:event_id>', methods=['GET'])
+@cache.cached_json(event_key)
 def get_event(event_id):
-    event = Event.query.get(event_id)
+    event = Event.query.options(joinedload(Event.creator)).get(event_id)
     if not event:
+        archived = include_archived() and ArchivedEvent.row_query(include_creator=True).filter(ArchivedEvent.id == event_id).first()
+        if archived:
+            return jsonify({'event': {**ArchivedEvent.row_to_dict(archived), 'archived': True}}), 200
         return jsonify({'error': 'Event not found'}), 404
     return jsonify({'event': event.to_dict(include_creator=True)}), 200
 
 @events_bp.route('', methods=['POST'])
 @jwt_required()
 def create_event():
-    current_user = get_current_user()
     data = request.get_json()
     required_fields = ['title', 'date', 'location']
     for f in required_fields:
@@ -34,38 +194,77 @@ def create_event():
     except:
         return jsonify({'error': 'Invalid date format'}), 400
     price = data.get('price', 0)
-    event = Event(title=data['title'], description=data.get('description',''), date=event_date, location=data['location'], price=price, creator_id=current_user.id)
+    try:
+        capacity = parse_capacity(data.get('capacity'))
+    except ValueError:
+        return jsonify({'error': 'Capacity must be a non-negative integer'}), 400
+    admission_queue = data.get('admission_queue', False)
+    error = admission_queue_error(admission_queue)
+    if error: return jsonify({'error': error}), 400
+    event = Event(title=data['title'], description=data.get('description',''), date=event_date, location=data['location'], price=price, capacity=capacity, admission_queue=admission_queue, creator_id=current_user.id)
+    event.sales = EventSales()
+    event.version = catalogue.next_version()
     db.session.add(event)
+    db.session.flush()
+    search.index_event(event)
     db.session.commit()
     return jsonify({'message': 'Event created', 'event': event.to_dict(include_creator=True)}), 201
 
 @events_bp.route('/<int:event_id>', methods=['PATCH'])
 @jwt_required()
 def update_event(event_id):
-    current_user = get_current_user()
     event = Event.query.get(event_id)
     if not event: return jsonify({'error':'Event not found'}),404
     if event.creator_id != current_user.id: return jsonify({'error':'Not authorized'}),403
     data = request.get_json()
-    for field in ['title','description','date','location','price']:
+    for field in ['title','description','date','location','price','capacity','admission_queue']:
         if field in data:
             if field=='date':
                 try: event.date=datetime.fromisoformat(data['date'].replace('Z','+00:00'))
                 except: return jsonify({'error':'Invalid date format'}),400
+            elif field=='capacity':
+                try: event.capacity=parse_capacity(data['capacity'])
+                except ValueError: return jsonify({'error':'Capacity must be a non-negative integer'}),400
+                if event.capacity is not None and event.capacity<event.tickets_sold: return jsonify({'error':'Capacity is below tickets already sold'}),400
+            elif field=='admission_queue':
+                error = admission_queue_error(data['admission_queue'])
+                if error: return jsonify({'error':error}),400
+                event.admission_queue=data['admission_queue']
             else:
                 setattr(event,field,data[field])
+    if any(f in data for f in search.FIELD_WEIGHTS): search.index_event(event)
+    event.version = catalogue.next_version()
     db.session.commit()
     return jsonify({'message':'Event updated','event':event.to_dict(include_creator=True)}),200
 
 @events_bp.route('/<int:event_id>', methods=['DELETE'])
 @jwt_required()
 def delete_event(event_id):
-    current_user = get_current_user()
     event = Event.query.get(event_id)
     if not event: return jsonify({'error':'Event not found'}),404
     if event.creator_id != current_user.id: return jsonify({'error':'Not authorized'}),403
+    search.unindex_event(event.id)
+    catalogue.tombstone(event.id)
     db.session.delete(event)
     db.session.commit()
     return jsonify({'message':'Event deleted'}),200
 
+@events_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_my_event_stats():
+    """Ticket counts per status for the caller's events, read from the precomputed aggregates"""
+    query = sales.stats_query().filter(Event.creator_id == current_user.id)
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        rows, next_cursor = keyset_page(query, [Event.id], request.args.get('cursor'), limit, [int])
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'events': [sales.stats_to_dict(r) for r in rows], 'next_cursor': next_cursor}), 200
 
+@events_bp.route('/<int:event_id>/stats', methods=['GET'])
+@jwt_required()
+def get_event_stats(event_id):
+    row = sales.stats_query().filter(Event.id == event_id).add_columns(Event.creator_id).first()
+    if not row: return jsonify({'error':'Event not found'}),404
+    if row.creator_id != current_user.id: return jsonify({'error':'Not authorized'}),403
+    return jsonify({'event': sales.stats_to_dict(row)}), 200
@@ -1,61 +1,303 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, request, jsonify, url_for
+from flask_jwt_extended import jwt_required, current_user
+from collections import Counter
 from datetime import datetime
-from models import db, User, Event, Ticket
+from sqlalchemy import case, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, ArchivedTicket, Event, EventSales, Ticket
+from pagination import PaginationError, parse_limit, keyset_page
+from fieldsets import parse_fields
+from routes.events import include_archived, with_archived
+from sales import SalesDelta
+import tasks
+from streaming import wants_stream, stream_json
 
 tickets_bp = Blueprint('tickets', __name__)
 
-def get_current_user():
-    return User.query.get(get_jwt_identity())
+MAX_BULK_ITEMS = 100
+
+def reserve_seats(event_id, count=1):
+    """Atomically take `count` seats in the current transaction; False if that would oversell"""
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id, or_(Event.capacity.is_(None), Event.tickets_sold + count <= Event.capacity))
+        .values(tickets_sold=Event.tickets_sold + count, updated_at=Event.updated_at)
+        .execution_options(synchronize_session=False))
+    return result.rowcount == 1
+
+def reserve_seat_batch(event_ids):
+    """Take one seat on each event in a single statement; returns the ids that still had room"""
+    if not db.engine.dialect.update_returning:
+        return {event_id for event_id in event_ids if reserve_seats(event_id)}
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id.in_(event_ids), or_(Event.capacity.is_(None), Event.tickets_sold < Event.capacity))
+        .values(tickets_sold=Event.tickets_sold + 1, updated_at=Event.updated_at)
+        .returning(Event.id)
+        .execution_options(synchronize_session=False))
+    return set(result.scalars())
+
+def release_seat_batch(counts):
+    """Give back `counts[event_id]` seats on each event in a single statement"""
+    db.session.execute(
+        update(Event)
+        .where(Event.id.in_(list(counts)))
+        .values(tickets_sold=Event.tickets_sold - case(counts, value=Event.id), updated_at=Event.updated_at)
+        .execution_options(synchronize_session=False))
+
+def cancel_rows(tickets):
+    """Cancel `tickets` with one conditional UPDATE, then release seats, count sales and queue messages
+    only for the rows it changed: of concurrent cancels of one ticket exactly one sees it still live"""
+    before = {t.id: (t.event_id, t.status, t.payment_status) for t in tickets}
+    stmt = (update(Ticket).where(Ticket.status!='canceled')
+            .values(status='canceled', updated_at=datetime.utcnow(),
+                    payment_status=case((Ticket.payment_status=='paid', 'refunded'), else_=Ticket.payment_status)))
+    if db.engine.dialect.update_returning:
+        changed = db.session.scalars(stmt.where(Ticket.id.in_(list(before))).returning(Ticket),
+                                     execution_options={'populate_existing': True}).all()
+    else:
+        changed = [t for t in tickets if db.session.execute(
+            stmt.where(Ticket.id==t.id).execution_options(synchronize_session=False)).rowcount]
+        for t in changed: db.session.expire(t)
+    done = {t.id for t in changed}
+    # Canceled by a concurrent request since they were read: reload rather than answer with the stale copy
+    for t in tickets:
+        if t.id not in done and before[t.id][1]!='canceled': db.session.expire(t)
+    if not changed: return changed
+    release_seat_batch(Counter(t.event_id for t in changed))
+    sales = SalesDelta()
+    for t in changed:
+        event_id, status, payment_status = before[t.id]
+        sales.add(event_id, status, payment_status, -1)
+        sales.add(event_id, 'canceled', 'refunded' if payment_status=='paid' else payment_status)
+    sales.apply()
+    tasks.enqueue_canceled(changed, refunded_ids=[t.id for t in changed if before[t.id][2]=='paid'])
+    return changed
+
+def insert_tickets(rows):
+    """Insert ticket rows in one multi-row INSERT and return them as Tickets. Flushing added
+    Tickets instead sends one INSERT per row on SQLite."""
+    return db.session.scalars(insert(Ticket).returning(Ticket), rows).all() if rows else []
+
+def parse_id_list(data, key):
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    ids = data.get(key)
+    if not isinstance(ids, list) or not ids:
+        raise ValueError(f'{key} must be a non-empty list')
+    if len(ids) > MAX_BULK_ITEMS:
+        raise ValueError(f'At most {MAX_BULK_ITEMS} {key} per request')
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError(f'{key} must contain integers')
+    return list(dict.fromkeys(ids))
 
 @tickets_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_ticket():
-    current_user = get_current_user()
     data = request.get_json()
     event_id = data.get('event_id')
     if not event_id: return jsonify({'error':'Event ID required'}),400
     event = Event.query.get(event_id)
     if not event: return jsonify({'error':'Event not found'}),404
-    existing = Ticket.query.filter_by(user_id=current_user.id, event_id=event_id).first()
-    if existing: return jsonify({'error':'Ticket already exists'}),400
-    ticket = Ticket(user_id=current_user.id, event_id=event_id, status='confirmed' if event.price==0 else 'pending', payment_status='free' if event.price==0 else 'unpaid')
+    # An event queued while claims were shared buys directly once they no longer are (see admission.py)
+    if event.admission_queue and current_app.extensions['admission'].shared: return queue_purchase(event)
+    # The seat counter and unique_user_event are the only guards: a check-then-insert
+    # would race between workers, so both conflicts surface from the database instead.
+    if not reserve_seats(event.id):
+        db.session.rollback()
+        return jsonify({'error':'Event is sold out'}),409
+    ticket = Ticket(user_id=current_user.id, event_id=event.id, status='confirmed' if event.price==0 else 'pending', payment_status='free' if event.price==0 else 'unpaid')
     db.session.add(ticket)
-    db.session.commit()
+    sales = SalesDelta()
+    sales.add(event.id, ticket.status, ticket.payment_status)
+    try:
+        sales.apply()  # autoflushes the ticket, so a duplicate can surface here
+        if ticket.status=='confirmed': tasks.enqueue_confirmed([ticket])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error':'Ticket already exists'}),400
     return jsonify({'message':'Ticket created','ticket':ticket.to_dict(include_relations=True)}),201
 
+def queue_purchase(event):
+    """Hand the purchase to the admission queue and answer with a claim to poll"""
+    db.session.rollback()
+    token = current_app.extensions['admission'].submit(current_user.id, event.id)
+    if token is None:
+        response = jsonify({'error':'Too many purchases waiting, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response,503
+    status_url = url_for('tickets.get_claim', token=token)
+    response = jsonify({'message':'Purchase queued','claim':token,'status':'queued','status_url':status_url})
+    response.headers['Location'] = status_url
+    return response,202
+
+@tickets_bp.route('/claims/<token>', methods=['GET'])
+@jwt_required()
+def get_claim(token):
+    """Outcome of a queued purchase: queued, confirmed (with the ticket) or rejected (with the error)"""
+    claim = current_app.extensions['admission'].status(token)
+    if not claim or claim['user_id'] != current_user.id: return jsonify({'error':'Claim not found'}),404
+    return jsonify(claim),200
+
 @tickets_bp.route('/<int:ticket_id>/confirm', methods=['PATCH'])
 @jwt_required()
 def confirm_ticket(ticket_id):
-    current_user = get_current_user()
     ticket = Ticket.query.get(ticket_id)
     if not ticket: return jsonify({'error':'Ticket not found'}),404
     if ticket.user_id != current_user.id: return jsonify({'error':'Not authorized'}),403
-    ticket.status='confirmed'
-    ticket.payment_status='paid'
-    ticket.updated_at=datetime.utcnow()
+    # A canceled ticket gave its seat back, so it cannot become confirmed again; the condition
+    # is repeated in the UPDATE in case a cancel commits between the read and the write.
+    if ticket.status=='canceled': return jsonify({'error':'Ticket is canceled'}),409
+    changed = (ticket.status, ticket.payment_status) != ('confirmed', 'paid')  # a repeated confirm sends no second receipt
+    sales = SalesDelta()
+    sales.transition(ticket, 'confirmed', 'paid')
+    result = db.session.execute(
+        update(Ticket).where(Ticket.id==ticket.id, Ticket.status!='canceled')
+        .values(status='confirmed', payment_status='paid', updated_at=datetime.utcnow())
+        .execution_options(synchronize_session='evaluate'))
+    if result.rowcount != 1:
+        db.session.rollback()
+        return jsonify({'error':'Ticket is canceled'}),409
+    sales.apply()
+    if changed: tasks.enqueue_confirmed([ticket])
     db.session.commit()
     return jsonify({'message':'Ticket confirmed','ticket':ticket.to_dict(include_relations=True)}),200
 
 @tickets_bp.route('/<int:ticket_id>/cancel', methods=['PATCH'])
 @jwt_required()
 def cancel_ticket(ticket_id):
-    current_user = get_current_user()
     ticket = Ticket.query.get(ticket_id)
     if not ticket: return jsonify({'error':'Ticket not found'}),404
     if ticket.user_id!=current_user.id and ticket.event.creator_id!=current_user.id: return jsonify({'error':'Not authorized'}),403
-    ticket.status='canceled'
-    if ticket.payment_status=='paid': ticket.payment_status='refunded'
-    ticket.updated_at=datetime.utcnow()
+    cancel_rows([ticket])
+    response = ticket.to_dict(include_relations=True)
     db.session.commit()
-    return jsonify({'message':'Ticket canceled','ticket':ticket.to_dict(include_relations=True)}),200
+    return jsonify({'message':'Ticket canceled','ticket':response}),200
+
+TICKET_LIST_FIELDS = Ticket.FIELDS + ('event',)
+
+def my_tickets_query(args, model=Ticket):
+    """Apply the fields, status, payment_status and when=upcoming|past parameters of GET /tickets/my to `model`'s rows"""
+    fields = parse_fields(args.get('fields'), TICKET_LIST_FIELDS)
+    with_event = fields is None or 'event' in fields
+    columns = fields and [f for f in fields if f != 'event']
+    query = model.row_query(include_relations=with_event, include_user=False, fields=columns).filter(model.user_id==current_user.id)
+    for field, allowed in EventSales.COUNTED.items():
+        value = args.get(field)
+        if value:
+            if value not in allowed: raise ValueError(f"{field} must be one of: {', '.join(allowed)}")
+            query = query.filter(getattr(model, field)==value)
+    when = args.get('when')
+    if when and not with_event: query = query.join(model.event_model, model.event_model.id==model.event_id)
+    if when == 'upcoming': query = query.filter(model.event_model.date >= datetime.utcnow())
+    elif when == 'past': query = query.filter(model.event_model.date < datetime.utcnow())
+    elif when: raise ValueError('when must be upcoming or past')
+    return query
 
 @tickets_bp.route('/my', methods=['GET'])
 @jwt_required()
 def get_my_tickets():
-    current_user = get_current_user()
-    tickets = Ticket.query.filter_by(user_id=current_user.id).all()
-    return jsonify({'tickets':[t.to_dict(include_relations=True) for t in tickets]}),200
+    """The caller's tickets in id order, one page at a time; each item nests its event but not the (same) user"""
+    try:
+        query, order = my_tickets_query(request.args), [Ticket.id]
+        if include_archived():
+            rows = with_archived(query, my_tickets_query(request.args, ArchivedTicket))
+            query, order = db.session.query(rows), [rows.c.id]
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    if wants_stream():
+        return stream_json('tickets', query.order_by(*order), Ticket.row_to_dict)
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        tickets, next_cursor = keyset_page(query, order, request.args.get('cursor'), limit, [int])
+    except PaginationError as e:
+        return jsonify({'error':str(e)}),400
+    return jsonify({'tickets':[Ticket.row_to_dict(t) for t in tickets],'next_cursor':next_cursor}),200
+
+@tickets_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_tickets_bulk():
+    """Buy one ticket on each of `event_ids` in a single transaction, reporting a result per event"""
+    try: event_ids = parse_id_list(request.get_json(silent=True), 'event_ids')
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    events = {e.id: e for e in Event.query.filter(Event.id.in_(event_ids))}
+    owned = set(db.session.scalars(db.select(Ticket.event_id).filter(Ticket.user_id==current_user.id, Ticket.event_id.in_(list(events)))))
+    candidates = [i for i in event_ids if i in events and i not in owned]
+    reserved = reserve_seat_batch(candidates) if candidates else set()
+    rows = [{'user_id':current_user.id,'event_id':i,'status':'confirmed' if events[i].price==0 else 'pending','payment_status':'free' if events[i].price==0 else 'unpaid'} for i in candidates if i in reserved]
+    sales = SalesDelta()
+    for row in rows: sales.add(row['event_id'], row['status'], row['payment_status'])
+    try:
+        tickets = {t.event_id: t for t in insert_tickets(rows)}
+        sales.apply()
+        tasks.enqueue_confirmed([t for t in tickets.values() if t.status=='confirmed'])
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error':'A concurrent purchase conflicted with this batch, please retry'}),409
+    # Serialized before the commit expires the tickets, which would reload them one by one
+    results = []
+    for event_id in event_ids:
+        if event_id not in events: results.append({'event_id':event_id,'status':404,'error':'Event not found'})
+        elif event_id in owned: results.append({'event_id':event_id,'status':400,'error':'Ticket already exists'})
+        elif event_id not in tickets: results.append({'event_id':event_id,'status':409,'error':'Event is sold out'})
+        else: results.append({'event_id':event_id,'status':201,'ticket':tickets[event_id].to_dict()})
+    db.session.commit()
+    return jsonify({'message':f'{len(tickets)} of {len(event_ids)} tickets created','results':results}),207 if len(tickets)!=len(event_ids) else 201
 
+def authorize_bulk(ticket_ids, allow_organizer):
+    """Load the requested tickets in one query and split them into per-item errors and allowed ids"""
+    query = Ticket.query.filter(Ticket.id.in_(ticket_ids))
+    if allow_organizer: query = query.join(Event).add_columns(Event.creator_id)
+    else: query = query.add_columns(db.literal(None))
+    found = {t.id: (t, creator_id) for t, creator_id in query}
+    errors, allowed = {}, []
+    for ticket_id in ticket_ids:
+        if ticket_id not in found: errors[ticket_id] = (404, 'Ticket not found')
+        else:
+            ticket, creator_id = found[ticket_id]
+            if ticket.user_id==current_user.id or (allow_organizer and creator_id==current_user.id): allowed.append(ticket)
+            else: errors[ticket_id] = (403, 'Not authorized')
+    return errors, allowed
 
+def bulk_results(ticket_ids, errors, tickets):
+    """Per-item results; call before the commit, which would expire the tickets and reload each one"""
+    done = {t.id: t for t in tickets}
+    return [{'ticket_id':i,'status':errors[i][0],'error':errors[i][1]} if i in errors else {'ticket_id':i,'status':200,'ticket':done[i].to_dict()} for i in ticket_ids]
 
+@tickets_bp.route('/bulk/confirm', methods=['PATCH'])
+@jwt_required()
+def confirm_tickets_bulk():
+    try: ticket_ids = parse_id_list(request.get_json(silent=True), 'ticket_ids')
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    errors, tickets = authorize_bulk(ticket_ids, allow_organizer=False)
+    for t in tickets:
+        if t.status=='canceled': errors[t.id] = (409, 'Ticket is canceled')
+    tickets = [t for t in tickets if t.id not in errors]
+    changed = [t for t in tickets if (t.status, t.payment_status) != ('confirmed', 'paid')]
+    sales = SalesDelta()
+    for t in tickets: sales.transition(t, 'confirmed', 'paid')
+    if tickets:
+        result = db.session.execute(
+            update(Ticket).where(Ticket.id.in_([t.id for t in tickets]), Ticket.status!='canceled')
+            .values(status='confirmed', payment_status='paid', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session='evaluate'))
+        if result.rowcount != len(tickets):
+            db.session.rollback()
+            return jsonify({'error':'A concurrent cancellation conflicted with this batch, please retry'}),409
+        sales.apply()
+        tasks.enqueue_confirmed(changed)
+    results = bulk_results(ticket_ids, errors, tickets)
+    db.session.commit()
+    return jsonify({'message':f'{len(tickets)} of {len(ticket_ids)} tickets confirmed','results':results}),207 if errors else 200
+
+@tickets_bp.route('/bulk/cancel', methods=['PATCH'])
+@jwt_required()
+def cancel_tickets_bulk():
+    """Cancel tickets owned by the caller or on events they organize, releasing their seats in one statement"""
+    try: ticket_ids = parse_id_list(request.get_json(silent=True), 'ticket_ids')
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    errors, tickets = authorize_bulk(ticket_ids, allow_organizer=True)
+    if tickets: cancel_rows(tickets)
+    results = bulk_results(ticket_ids, errors, tickets)
+    db.session.commit()
+    return jsonify({'message':f'{len(tickets)} of {len(ticket_ids)} tickets canceled','results':results}),207 if errors else 200
@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+
+from models import db, Event, Ticket, EventSales
+
+COUNT_COLUMNS = [value for values in EventSales.COUNTED.values() for value in values]
+
+
+class SalesDelta:
+    """Collects ticket state changes during a request and applies them to event_sales in one
+    executemany UPDATE over the touched events, inside the same transaction as the ticket writes."""
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: defaultdict(int))
+
+    def add(self, event_id, status, payment_status, count=1):
+        self.changes[event_id][status] += count
+        self.changes[event_id][payment_status] += count
+
+    def transition(self, ticket, status, payment_status):
+        """Record `ticket` moving to a new state; call before mutating it"""
+        self.add(ticket.event_id, ticket.status, ticket.payment_status, -1)
+        self.add(ticket.event_id, status, payment_status)
+
+    def apply(self):
+        """Write the collected changes; flushes the session first, so pending tickets are inserted"""
+        deltas = {event_id: {c: n for c, n in counts.items() if n and c in COUNT_COLUMNS}
+                  for event_id, counts in self.changes.items()}
+        deltas = {event_id: d for event_id, d in deltas.items() if d}
+        self.changes.clear()
+        db.session.flush()
+        if not deltas:
+            return
+        # One parameter set per event, all with the same columns (zero where an event has no change)
+        table = EventSales.__table__
+        columns = [c for c in COUNT_COLUMNS if any(c in d for d in deltas.values())]
+        result = db.session.execute(
+            update(table).where(table.c.event_id == bindparam('b_event_id'))
+            .values({c: table.c[c] + bindparam(f'b_{c}') for c in columns}),
+            [{'b_event_id': event_id, **{f'b_{c}': d.get(c, 0) for c in columns}} for event_id, d in deltas.items()])
+        if db.engine.dialect.supports_sane_multi_rowcount and result.rowcount == len(deltas):
+            return
+        # No aggregate yet for some event (e.g. rows bulk-loaded without reconciling): count those from scratch
+        existing = set(db.session.scalars(select(EventSales.event_id).where(EventSales.event_id.in_(list(deltas)))))
+        missing = [event_id for event_id in deltas if event_id not in existing]
+        if missing:
+            db.session.execute(insert(EventSales).from_select(['event_id'] + COUNT_COLUMNS, counts_select(missing)))
+
+
+def counts_select(event_ids=None):
+    """SELECT event_id, <one count per column> FROM tickets GROUP BY event_id"""
+    columns = [func.coalesce(func.sum(case((getattr(Ticket, field) == value, 1), else_=0)), 0).label(value)
+               for field, values in EventSales.COUNTED.items() for value in values]
+    query = select(Ticket.event_id, *columns).group_by(Ticket.event_id)
+    if event_ids is not None:
+        query = query.where(Ticket.event_id.in_(event_ids))
+    return query
+
+
+def rebuild(connection):
+    """Recompute every aggregate from tickets in one GROUP BY pass; returns the number of events"""
+    connection.execute(delete(EventSales))
+    connection.execute(insert(EventSales).from_select(['event_id'] + COUNT_COLUMNS, counts_select()))
+    # Events without tickets still get a zero row so stats reads never miss
+    connection.execute(insert(EventSales).from_select(
+        ['event_id'], select(Event.id).where(~Event.id.in_(select(EventSales.event_id)))))
+    return connection.execute(select(func.count()).select_from(EventSales)).scalar()
+
+
+def stats_query():
+    """Organizer view of events joined with their aggregates"""
+    return (db.session.query(Event.id, Event.title, Event.date, Event.capacity, Event.tickets_sold,
+                             *[func.coalesce(getattr(EventSales, c), 0).label(c) for c in COUNT_COLUMNS])
+            .outerjoin(EventSales, EventSales.event_id == Event.id))
+
+
+def stats_to_dict(row):
+    return {
+        'event_id': row.id, 'title': row.title, 'date': row.date, 'capacity': row.capacity,
+        'tickets_sold': row.tickets_sold, 'sales': {c: getattr(row, c) for c in COUNT_COLUMNS},
+    }
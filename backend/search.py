@@ -0,0 +1,155 @@
+"""Full-text search over event titles, descriptions and locations.
+
+On SQLite the index is an FTS5 table ranked with bm25(). Other databases get a plain inverted
+index, event_terms(term, event_id, weight). Either way the event routes call index_event() and
+unindex_event() inside their own transaction, so the index commits or rolls back with the event.
+"""
+import re
+import unicodedata
+from collections import Counter
+
+from sqlalchemy import (DDL, Column, Float, Index, Integer, MetaData, String, Table, bindparam, delete, event,
+                        func, insert, literal_column, select, text)
+
+from models import db, Event
+
+TOKEN = re.compile(r'\w+')
+MAX_QUERY_TERMS = 8
+MAX_TERM_LENGTH = 64
+# Relative weight of a match in each field, in the FTS5 column order
+FIELD_WEIGHTS = {'title': 10.0, 'description': 1.0, 'location': 5.0}
+
+# Dropped from queries (but still indexed): they match most events, add nothing to the ranking and
+# make bm25() walk long position lists
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the this to was were will with'.split())
+
+FTS_TABLE = 'events_fts'
+CREATE_FTS = DDL(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                 f"{', '.join(FIELD_WEIGHTS)}, tokenize='unicode61 remove_diacritics 2')")
+
+# Kept out of db.metadata: the table only exists where FTS5 is not used (see the DDL hooks below)
+terms_metadata = MetaData()
+event_terms = Table(
+    'event_terms', terms_metadata,
+    Column('term', String(MAX_TERM_LENGTH), primary_key=True),
+    Column('event_id', Integer, primary_key=True),
+    Column('weight', Float, nullable=False),
+    Index('ix_event_terms_event_id', 'event_id'),
+)
+
+
+def uses_fts5(bind):
+    return bind.dialect.name == 'sqlite'
+
+
+@event.listens_for(Event.__table__, 'after_create')
+def create_index(target, connection, **kw):
+    if uses_fts5(connection):
+        connection.execute(CREATE_FTS)
+    else:
+        event_terms.create(connection, checkfirst=True)
+
+
+@event.listens_for(Event.__table__, 'before_drop')
+def drop_index(target, connection, **kw):
+    if uses_fts5(connection):
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    else:
+        event_terms.drop(connection, checkfirst=True)
+
+
+def tokenize(value):
+    """Lowercased words with diacritics removed, matching FTS5's unicode61 tokenizer closely enough"""
+    folded = ''.join(c for c in unicodedata.normalize('NFKD', (value or '').lower()) if not unicodedata.combining(c))
+    return [t for t in TOKEN.findall(folded) if len(t) <= MAX_TERM_LENGTH]
+
+
+def term_weights(title, description, location):
+    """Weight of each distinct term in an event, summed over the fields it appears in"""
+    weights = Counter()
+    for field, value in zip(FIELD_WEIGHTS, (title, description, location)):
+        for term in tokenize(value):
+            weights[term] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def index_event(event, session=None):
+    """(Re)index one event in the current transaction; the event must have an id (flush first)"""
+    session = session or db.session
+    unindex_event(event.id, session)
+    if uses_fts5(session.get_bind()):
+        session.execute(text(f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) '
+                             'VALUES (:id, :title, :description, :location)'),
+                        {'id': event.id, 'title': event.title, 'description': event.description,
+                         'location': event.location})
+        return
+    weights = term_weights(event.title, event.description, event.location)
+    if weights:
+        session.execute(insert(event_terms), [{'term': t, 'event_id': event.id, 'weight': w}
+                                              for t, w in weights.items()])
+
+
+def unindex_event(event_id, session=None):
+    unindex_events([event_id], session)
+
+
+def unindex_events(event_ids, session=None):
+    session = session or db.session
+    if uses_fts5(session.get_bind()):
+        session.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN :ids').bindparams(bindparam('ids', expanding=True)),
+                        {'ids': list(event_ids)})
+    else:
+        session.execute(delete(event_terms).where(event_terms.c.event_id.in_(event_ids)))
+
+
+def rebuild(connection, batch_size=10000):
+    """Reindex every event from scratch; returns the number of events indexed"""
+    if uses_fts5(connection):
+        connection.execute(CREATE_FTS)
+        connection.exec_driver_sql(f'DELETE FROM {FTS_TABLE}')
+        connection.exec_driver_sql(f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) '
+                                   'SELECT id, title, description, location FROM events')
+        return connection.execute(select(func.count()).select_from(Event.__table__)).scalar()
+    event_terms.create(connection, checkfirst=True)
+    connection.execute(delete(event_terms))
+    total = 0
+    rows = connection.execution_options(yield_per=batch_size).execute(
+        select(Event.id, Event.title, Event.description, Event.location))
+    for batch in rows.partitions():
+        connection.execute(insert(event_terms), [
+            {'term': t, 'event_id': r.id, 'weight': w}
+            for r in batch for t, w in term_weights(r.title, r.description, r.location).items()])
+        total += len(batch)
+    return total
+
+
+def match_select(terms, ranked=True):
+    """Select (id, score) of events containing every term; score is 0 for all rows when not ranked"""
+    if uses_fts5(db.session.get_bind()):
+        weights = ', '.join(str(w) for w in FIELD_WEIGHTS.values())
+        score = f'bm25({FTS_TABLE}, {weights})' if ranked else '0.0'
+        return (select(literal_column('rowid').label('id'), literal_column(score).label('score'))
+                .select_from(text(FTS_TABLE))
+                .where(text(f'{FTS_TABLE} MATCH :match').bindparams(match=' '.join(f'"{t}"' for t in terms))))
+    score = -func.sum(event_terms.c.weight) if ranked else literal_column('0.0')
+    return (select(event_terms.c.event_id.label('id'), score.label('score'))
+            .where(event_terms.c.term.in_(terms))
+            .group_by(event_terms.c.event_id)
+            .having(func.count() == len(terms)))
+
+
+def matches(q, max_ranked=None):
+    """Subquery of (id, score) for events containing every word of `q`; lower scores rank higher.
+
+    Scoring every match is what makes a query on very common words slow, so when more than
+    `max_ranked` events match, all scores are 0 and results fall back to id order.
+    Raises ValueError when `q` has no searchable words.
+    """
+    terms = list(dict.fromkeys(tokenize(q)))
+    if not terms:
+        raise ValueError('q must contain at least one word')
+    terms = ([t for t in terms if t not in STOPWORDS] or terms)[:MAX_QUERY_TERMS]
+    if max_ranked and db.session.execute(match_select(terms, ranked=False).limit(1).offset(max_ranked)).first():
+        return match_select(terms, ranked=False).subquery('matches')
+    return match_select(terms).subquery('matches')
@@ -2,6 +2,7 @@
 from app import create_app, db
 from models import User, Event
 from datetime import datetime
+import search
 
 app = create_app()
 
@@ -40,6 +41,8 @@ with app.app_context():
         )
     ]
     db.session.add_all(events)
+    db.session.flush()
+    search.rebuild(db.session.connection())
     db.session.commit()
 
     print("✅ Seed data inserted successfully!")
\ No newline at end of file
@@ -0,0 +1,43 @@
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # optional: several times faster than the stdlib encoder
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+COMPACT = (',', ':')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed and stdlib json otherwise.
+
+    Datetimes are written as ISO 8601 on both paths (Flask's default would use HTTP dates), so
+    projected rows can hand datetime objects straight to the encoder.
+    """
+
+    fast = orjson is not None
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        # response() passes the compact separators outside debug mode, which is all orjson writes
+        if self.fast and set(kwargs) <= {'indent', 'separators'} and kwargs.get('separators', COMPACT) == COMPACT:
+            option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+            if kwargs.get('indent'):
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode()
+            except TypeError:
+                pass  # e.g. integers beyond 64 bits; let the stdlib encoder handle them
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.fast and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
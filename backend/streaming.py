@@ -0,0 +1,30 @@
+from flask import Response, current_app, request, stream_with_context
+
+from models import db
+
+STREAM_BATCH_SIZE = 500
+
+
+def wants_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def stream_json(key, query, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Stream `{"<key>": [...]}` while fetching the rows of `query` in batches from a server-side cursor.
+
+    Only one batch of ORM objects is alive at a time, so memory stays flat however many rows match.
+    """
+    dumps = current_app.json.dumps
+    # Execute before the first byte goes out, so a failing query still becomes a proper error response
+    result = db.session.execute(query.statement.execution_options(yield_per=batch_size))
+
+    def generate():
+        yield f'{{"{key}":['
+        first = True
+        for rows in result.partitions():
+            chunk = ','.join(dumps(serialize(row)) for row in rows)
+            yield chunk if first else ',' + chunk
+            first = False
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -0,0 +1,54 @@
+"""Post-processing for ticket changes, run from the outbox after the request has committed.
+
+Each handler gets the message payload and its idempotency key, to pass on to any outside service
+(mailer, payment provider) so that a retried message is not acted on twice. Handlers that need
+more than the payload read it fresh: the ticket may have changed again since the message was written.
+"""
+import logging
+
+from models import db, Ticket, User
+import outbox
+
+logger = logging.getLogger('eventhub.tasks')
+
+
+def ticket_payload(ticket, **extra):
+    return {'ticket_id': ticket.id, 'event_id': ticket.event_id, 'user_id': ticket.user_id, **extra}
+
+
+def change_key(topic, ticket):
+    """Idempotency key of one change: the ticket's new updated_at tells a later change of the same
+    kind (a second refund) apart from a retry of this one"""
+    return f'{topic}:{ticket.id}:{ticket.updated_at.isoformat()}'
+
+
+def enqueue_confirmed(tickets):
+    """Queue receipts for tickets that just became confirmed; call in their transaction, after
+    their updated_at is set"""
+    outbox.enqueue_many([('ticket.confirmed', ticket_payload(t, payment_status=t.payment_status),
+                          change_key('ticket.confirmed', t)) for t in tickets])
+
+
+def enqueue_canceled(tickets, refunded_ids=()):
+    """Queue cancellation notices, and refunds for `refunded_ids`; call in the tickets' transaction,
+    after their updated_at is set"""
+    refunded_ids = set(refunded_ids)
+    outbox.enqueue_many([('ticket.canceled', ticket_payload(t, refund=t.id in refunded_ids),
+                          change_key('ticket.canceled', t)) for t in tickets])
+
+
+@outbox.handler('ticket.confirmed')
+def send_receipt(payload, key):
+    user = db.session.get(User, payload['user_id'])
+    if user is None:
+        return  # the account is gone, nobody to send to
+    logger.info('Receipt for ticket %s (%s) to %s [%s]', payload['ticket_id'], payload['payment_status'], user.email, key)
+
+
+@outbox.handler('ticket.canceled')
+def process_cancellation(payload, key):
+    if payload['refund']:
+        logger.info('Refund for ticket %s [%s]', payload['ticket_id'], key)
+    ticket = db.session.get(Ticket, payload['ticket_id'])
+    if ticket is not None:
+        logger.info('Cancellation notice for ticket %s to user %s [%s]', ticket.id, ticket.user_id, key)